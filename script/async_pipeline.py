@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from load_and_preprocess import load_data_and_prepare
+from main import compute_participant_outputs, save_participant_outputs, report_path_for
+
+_DONE = None  # sentinelle de fin de file
+
+
+async def _load_stage(engine, pids, loaded, io_pool, n_consumers, max_speed_kmh):
+    loop = asyncio.get_running_loop()
+    for pid in pids:
+        print(f"\n=== Participant {pid} (chargement) ===")
+        try:
+            df = await loop.run_in_executor(io_pool, load_data_and_prepare, engine, pid, max_speed_kmh)
+        except Exception as exc:
+            print(f"[ERREUR] Chargement {pid} : {exc}")
+            continue
+        if df.empty:
+            print(f"Aucun point GPS pour {pid}.")
+            continue
+        # bloque si la file est pleine : le préchargement reste borné
+        await loaded.put((pid, df))
+    for _ in range(n_consumers):
+        await loaded.put(_DONE)
+
+
+async def _compute_stage(loaded, computed, cpu_pool, report_options):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loaded.get()
+        if item is _DONE:
+            return
+        pid, df = item
+        try:
+            outputs = await loop.run_in_executor(
+                cpu_pool, compute_participant_outputs, df, pid, None, report_options, report_path_for(pid)
+            )
+        except Exception as exc:
+            print(f"[ERREUR] Calcul {pid} : {exc}")
+            continue
+        if outputs is not None:
+            outputs['points'] = df   # enregistré avec les sorties d'étapes
+            await computed.put((pid, outputs))
+
+
+async def _write_stage(computed, io_pool, engine, write_db, run_id):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await computed.get()
+        if item is _DONE:
+            return
+        pid, outputs = item
+        try:
+            await loop.run_in_executor(
+                io_pool,
+                lambda: save_participant_outputs(pid, outputs, engine, write_db=write_db, run_id=run_id)
+            )
+        except Exception as exc:
+            print(f"[ERREUR] Écriture {pid} : {exc}")
+
+
+async def _run(engine, pids, workers, prefetch, write_db, run_id, max_speed_kmh, report_options):
+    loaded = asyncio.Queue(maxsize=prefetch)
+    computed = asyncio.Queue(maxsize=prefetch)
+
+    with ThreadPoolExecutor(max_workers=2) as io_pool, \
+            ProcessPoolExecutor(max_workers=workers) as cpu_pool:
+        writer = asyncio.create_task(_write_stage(computed, io_pool, engine, write_db, run_id))
+        await asyncio.gather(
+            _load_stage(engine, pids, loaded, io_pool, workers, max_speed_kmh),
+            *[_compute_stage(loaded, computed, cpu_pool, report_options) for _ in range(workers)]
+        )
+        await computed.put(_DONE)
+        await writer
+
+
+def run_async_pipeline(
+    engine,
+    pids: list,
+    workers: int = 2,
+    prefetch: int = 2,
+    write_db: bool = False,
+    run_id: str = None,
+    max_speed_kmh: float = 150,
+    report_options: dict = None
+) -> None:
+    """
+    Traite la cohorte en pipeline producteur/consommateur à trois étages :
+      1) chargement des points GPS depuis PostgreSQL (thread),
+      2) calcul des stops/moves et écriture au fil de l'eau du rapport HTML
+         (pool de processus, `workers` participants en parallèle),
+      3) écriture des CSV, résultats en base et graphiques du mode assets (thread).
+
+    Les files entre étages sont bornées à `prefetch` participants : le chargement
+    des participants suivants recouvre le calcul en cours sans accumuler les
+    DataFrames en mémoire. Une erreur sur un participant est signalée et n'arrête
+    pas la cohorte.
+    """
+    asyncio.run(_run(engine, pids, workers, prefetch, write_db, run_id, max_speed_kmh, report_options))
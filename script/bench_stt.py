@@ -0,0 +1,283 @@
+"""
+S-TT benchmark on synthetic cities
+
+Generates site layouts, protection cells and trajectories locally (no stt_input/ files, no index on disk), times
+each phase of STT.truncate for a grid of parameters, checks the truncation results against a reference run and
+saves everything as JSON, so that results can be compared across versions:
+
+    python bench_stt.py --points 1000,10000 --sites 500,2000 --k 4,8 --output data/bench/before.json
+    python bench_stt.py --points 1000,10000 --sites 500,2000 --k 4,8 --reference data/bench/before.json
+
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box
+from shapely.strtree import STRtree
+import skmob as sm
+
+import stt_py
+from stt_py import STT
+
+# synthetic cities are laid out in a metric CRS, trajectories are given in WGS84 like real data
+_PCELLS_CRS = 'EPSG:3067'
+_TRAJECTORY_CRS = 'EPSG:4326'
+_ORIGIN = (380000.0, 6670000.0)  # south-west corner of the city (Helsinki area in EPSG:3067)
+
+# timed STT methods and the phase they are reported under (see _instrument)
+_PHASES = {
+    '_split_trajectory': 'split',
+    '_get_pcell_ids': 'cell_lookup',
+    '_direction_mask': 'direction',
+    '_truncate_and_reassemble': 'reassembly',
+    '_truncate_trajectory': 'total',
+}
+
+# parameters identifying a benchmark case (and matching it with the reference run)
+_CASE_KEYS = ('n_points', 'n_sites', 'k', 'alpha', 'buffer', 'seed')
+
+
+def synthetic_city(n_sites, k, seed=0, extent_m=12000.0):
+    """
+    Random site layout of a city: half of the sites are concentrated around a few centres, the other half spread
+    over the whole extent. Sites are grouped into cells of at least k neighbouring sites (strips along x, chunks
+    along y) and each cell is the union of the Voronoi regions of its sites.
+
+    :param n_sites: number of sites (at least k)
+    :param k: minimum number of sites per protection cell
+    :param seed: random seed
+    :param extent_m: side of the square city, in metres
+    :return: tuple (cells, sites) in the format of STT(protection_sites=...), in _PCELLS_CRS
+    """
+    rng = np.random.default_rng(seed)
+    x0, y0 = _ORIGIN
+    bounds = box(x0, y0, x0 + extent_m, y0 + extent_m)
+
+    n_dense = n_sites // 2
+    centres = rng.uniform(0.2 * extent_m, 0.8 * extent_m, size=(max(1, n_sites // 200), 2))
+    dense = centres[rng.integers(len(centres), size=n_dense)] + rng.normal(0, extent_m / 20, size=(n_dense, 2))
+    sparse = rng.uniform(0, extent_m, size=(n_sites - n_dense, 2))
+    xy = np.clip(np.concatenate([dense, sparse]), 1.0, extent_m - 1.0) + (x0, y0)
+
+    # Voronoi region of each site (the output order of voronoi_polygons is not the input order)
+    regions = np.array(shapely.voronoi_polygons(shapely.multipoints(xy), extend_to=bounds).geoms)
+    point_idx, region_idx = STRtree(regions).query(shapely.points(xy), predicate='intersects')
+    first = np.unique(point_idx, return_index=True)[1]
+    site_regions = regions[region_idx[first]]
+
+    cells, sites = {}, {}
+    n_strips = max(1, int(np.sqrt(n_sites // k)))
+    for strip in np.array_split(np.argsort(xy[:, 0], kind='stable'), n_strips):
+        strip = strip[np.argsort(xy[strip, 1], kind='stable')]
+        for members in np.array_split(strip, max(1, len(strip) // k)):
+            myid = len(cells) + 1
+            cells[myid] = shapely.union_all(site_regions[members]).intersection(bounds)
+            sites[myid] = xy[members]
+    return cells, sites
+
+
+def synthetic_trajectory(n_points, seed=0, extent_m=12000.0, step_s=5, stay_points=300, n_stays=None):
+    """
+    Random walk through the city with stays: the walker moves at about 8 m/s and stops n_stays times for
+    stay_points points (at most 0.2 m/s).
+
+    :param n_points: number of trajectory points
+    :param seed: random seed
+    :param extent_m: side of the square city, in metres
+    :param step_s: sampling interval, in seconds
+    :param stay_points: number of points of each stay
+    :param n_stays: number of stays (default: one per 2000 points, at least one)
+    :return: tuple (trajectory, stays): a skmob.TrajDataFrame in _TRAJECTORY_CRS and the stays as sensitive
+        locations [lng, lat, start datetime, end datetime] of the trajectory
+    """
+    rng = np.random.default_rng(seed)
+    n_stays = max(1, n_points // 2000) if n_stays is None else n_stays
+    starts = np.linspace(0, n_points, n_stays + 2)[1:-1].astype(int)
+    stopped = np.zeros(n_points, dtype=bool)
+    for s in starts:
+        stopped[s:s + stay_points] = True
+
+    speed = np.where(stopped, rng.uniform(0, 0.2, n_points), rng.normal(8.0, 1.0, n_points).clip(0.5))
+    heading = np.cumsum(rng.normal(0, 0.2, n_points)) + rng.uniform(0, 2 * np.pi)
+    xy = np.empty((n_points, 2))
+    xy[0] = rng.uniform(0.25 * extent_m, 0.75 * extent_m, 2)
+    for i in range(1, n_points):
+        step = xy[i-1] + speed[i] * step_s * np.array([np.cos(heading[i]), np.sin(heading[i])])
+        # bounce back from the city limits
+        outside = (step < 10.0) | (step > extent_m - 10.0)
+        if outside.any():
+            heading[i:] += np.pi
+            step = xy[i-1] - (step - xy[i-1])
+        xy[i] = step.clip(10.0, extent_m - 10.0)
+
+    lng, lat = stt_py._project_xy(xy[:, 0] + _ORIGIN[0], xy[:, 1] + _ORIGIN[1], _PCELLS_CRS, _TRAJECTORY_CRS)
+    times = pd.Timestamp('2024-01-01 06:00:00') + pd.to_timedelta(np.arange(n_points) * step_s, unit='s')
+    trajectory = sm.TrajDataFrame(pd.DataFrame({'lng': lng, 'lat': lat, 'datetime': times}),
+                                  latitude='lat', longitude='lng', datetime='datetime')
+
+    stays = []
+    for s in starts:
+        e = min(s + stay_points, n_points) - 1
+        if s < e:
+            stays.append([lng[s:e+1].mean(), lat[s:e+1].mean(), trajectory['datetime'].iloc[s],
+                          trajectory['datetime'].iloc[e]])
+    return trajectory, stays
+
+
+def _instrument(stt, timings):
+    # wraps the timed methods of one STT object, accumulating their wall-clock time in timings[phase]
+    def timed(method, phase):
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timings[phase] += time.perf_counter() - t0
+        return wrapper
+
+    for name, phase in _PHASES.items():
+        setattr(stt, name, timed(getattr(stt, name), phase))
+
+
+def result_digest(truncated):
+    """Digest of a truncated trajectory (positions and timestamps of the points kept), stable across versions."""
+    h = hashlib.sha1()
+    h.update(np.asarray(truncated.index, dtype=np.int64).tobytes())
+    h.update('\n'.join(truncated['datetime'].astype(str)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def run_case(n_points, n_sites, k, alpha, buffer, seed=0, repeats=3):
+    """
+    Benchmarks STT.truncate for one set of parameters: the city and the trajectory are generated once, the
+    trajectory is truncated repeats times by an instrumented STT object.
+
+    :return: dict with the parameters, the number of points kept, the result digest and the median time of each
+        phase in seconds ('reassembly' excludes the direction test it contains, 'setup' is the STT construction)
+    """
+    cells, sites = synthetic_city(n_sites, k, seed=seed)
+    trajectory, stays = synthetic_trajectory(n_points, seed=seed)
+
+    t0 = time.perf_counter()
+    stt = STT(pcells_crs=_PCELLS_CRS, trajectory_crs=_TRAJECTORY_CRS, alpha=alpha, k=k, buffer=buffer,
+              sensitive_locations=stays, add_endpoints=True, add_stops=False, protection_sites=(cells, sites))
+    setup = time.perf_counter() - t0
+
+    runs = []
+    for _ in range(repeats):
+        timings = defaultdict(float)
+        _instrument(stt, timings)
+        truncated = stt.truncate([trajectory.copy()])[0]
+        for name in _PHASES:
+            delattr(stt, name)
+        timings['reassembly'] -= timings['direction']
+        runs.append(timings)
+
+    return {
+        'n_points': n_points, 'n_sites': n_sites, 'k': k, 'alpha': alpha, 'buffer': buffer, 'seed': seed,
+        'n_cells': len(cells),
+        'n_sensitive_locations': len(stays),
+        'n_kept': len(truncated),
+        'digest': result_digest(truncated),
+        'timings_s': {'setup': setup, **{phase: float(np.median([r[phase] for r in runs]))
+                                         for phase in _PHASES.values()}},
+    }
+
+
+def check_reference(cases, reference):
+    """
+    Compares the results of cases with those of a reference run (same parameters, same digest).
+
+    :return: list of (case key, reference n_kept, n_kept) of the cases whose result differs; cases missing from
+        the reference are not checked
+    """
+    expected = {tuple(c[key] for key in _CASE_KEYS): c for c in reference['cases']}
+    mismatches = []
+    for case in cases:
+        key = tuple(case[k] for k in _CASE_KEYS)
+        ref = expected.get(key)
+        if ref is not None and ref['digest'] != case['digest']:
+            mismatches.append((dict(zip(_CASE_KEYS, key)), ref['n_kept'], case['n_kept']))
+        if ref is not None:
+            case['speedup_vs_reference'] = ref['timings_s']['total'] / max(case['timings_s']['total'], 1e-9)
+    return mismatches
+
+
+def _write_json_atomic(path, payload):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def _float_list(value):
+    return [float(v) for v in value.split(',')]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="S-TT benchmark on synthetic cities")
+    parser.add_argument('--points', type=_int_list, default=[1000, 5000], help="trajectory lengths (comma-separated)")
+    parser.add_argument('--sites', type=_int_list, default=[500, 2000], help="numbers of sites (comma-separated)")
+    parser.add_argument('--k', type=_int_list, default=[4], help="values of k (comma-separated)")
+    parser.add_argument('--alpha', type=_float_list, default=[60.0], help="opening angles (comma-separated)")
+    parser.add_argument('--buffer', type=_float_list, default=[0.0], help="buffer sizes in metres (comma-separated)")
+    parser.add_argument('--seeds', type=_int_list, default=[0], help="random seeds (comma-separated)")
+    parser.add_argument('--repeats', type=int, default=3, help="truncations per case (median time is kept)")
+    parser.add_argument('--output', default="data/bench/bench_stt.json", help="JSON results file")
+    parser.add_argument('--reference', default=None,
+                        help="JSON results of a reference run: results must match, speedups are reported")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = []
+    grid = itertools.product(args.points, args.sites, args.k, args.alpha, args.buffer, args.seeds)
+    for n_points, n_sites, k, alpha, buffer, seed in grid:
+        case = run_case(n_points, n_sites, k, alpha, buffer, seed=seed, repeats=args.repeats)
+        cases.append(case)
+        t = case['timings_s']
+        print(f"points={n_points} sites={n_sites} k={k} alpha={alpha:g} buffer={buffer:g} seed={seed}: "
+              f"kept {case['n_kept']}/{n_points}, total {t['total']:.3f}s (split {t['split']:.3f}s, "
+              f"cells {t['cell_lookup']:.3f}s, direction {t['direction']:.3f}s, reassembly {t['reassembly']:.3f}s)")
+
+    mismatches = []
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            mismatches = check_reference(cases, json.load(f))
+        for key, ref_kept, kept in mismatches:
+            print(f"MISMATCH {key}: reference kept {ref_kept} points, this run {kept}")
+
+    _write_json_atomic(args.output, {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'shapely': shapely.__version__,
+        'repeats': args.repeats,
+        'reference': args.reference,
+        'mismatches': len(mismatches),
+        'cases': cases,
+    })
+    print(f"results written to {args.output}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
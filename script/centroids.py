@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import geopandas as gpd
 from shapely.geometry import Point
 import os
@@ -35,3 +36,86 @@ def generate_home_work_centroids_shapefile(classified_stops, output_path="stt_in
     gdf_out.to_file(output_file, driver='ESRI Shapefile')
 
     return output_file
+
+def home_work_sensitive_locations(stops, classified_stops, trajectory, match_radius_m=100):
+    """
+    Visites des lieux Home/Work sous forme de lieux sensibles STT (points
+    d'arrêt [lng, lat, début, fin]) : stops (un par visite, ex. stops bruts)
+    situés à moins de match_radius_m d'un lieu Home/Work de classified_stops,
+    bornes recalées sur les horodatages de trajectory (premier et dernier point
+    de la visite). Les visites sans point ou chevauchant la précédente sont
+    ignorées.
+    """
+    places = classified_stops[classified_stops['place_type'].isin(['Home', 'Work'])]
+    if places.empty or stops.empty:
+        return []
+
+    # Étape 1 : visites proches d'un lieu Home/Work (haversine, tous couples en une fois)
+    lat1, lon1 = np.radians(stops['lat'].to_numpy())[:, None], np.radians(stops['lon'].to_numpy())[:, None]
+    lat2, lon2 = np.radians(places['lat'].to_numpy())[None, :], np.radians(places['lon'].to_numpy())[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    dist_m = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+    visits = stops[(dist_m <= match_radius_m).any(axis=1)].sort_values('start_time')
+
+    # Étape 2 : premier et dernier point de la trajectoire dans chaque visite
+    # (horodatages naïfs des stops en UTC, comme dans classify_home_work)
+    times = pd.DatetimeIndex(trajectory['datetime'])
+
+    def to_traj_tz(col):
+        col = pd.DatetimeIndex(pd.to_datetime(col, utc=True))
+        return col.tz_convert(None) if times.tz is None else col.tz_convert(times.tz)
+
+    # Un point est laissé avant et après chaque visite : STT ignore les
+    # sous-trajectoires d'un seul point, et ne tronquerait pas la sous-trajectoire
+    # voisine d'une visite qui atteint une extrémité de la trajectoire.
+    j_start = np.maximum(times.searchsorted(to_traj_tz(visits['start_time']), side='left'), 1)
+    j_end = np.minimum(times.searchsorted(to_traj_tz(visits['end_time']), side='right') - 1, len(times) - 2)
+
+    # Étape 3 : lieux sensibles dans l'ordre chronologique, sans chevauchement
+    locations, last_end = [], -1
+    for lon, lat, s, e in zip(visits['lon'], visits['lat'], j_start, j_end):
+        if s > e or s <= last_end:
+            continue
+        locations.append([lon, lat, trajectory['datetime'].iloc[s], trajectory['datetime'].iloc[e]])
+        last_end = e
+    return locations
+
+def truncate_home_work(df, stops, classified_stops, pcells_crs, protection_sites=None, match_radius_m=100, **stt_kwargs):
+    """
+    Anonymisation S-TT d'un participant directement après classify_home_work,
+    en mémoire : les visites des lieux Home/Work servent de lieux sensibles
+    (home_work_sensitive_locations).
+
+    Les cellules de protection viennent d'une couche de sites externe
+    (adresses, bâtiments...) regroupés en cellules d'au moins k sites : jamais
+    des lieux Home/Work eux-mêmes, dont la position se déduirait des points
+    où la trajectoire tronquée s'arrête.
+
+    Args:
+        df (pd.DataFrame): Points GPS prétraités ('lat', 'lon', 'timestamp')
+        stops (pd.DataFrame): Stops bruts (une ligne par visite)
+        classified_stops (pd.DataFrame): Résultat de classify_home_work
+        pcells_crs (str): CRS métrique des cellules de protection
+        protection_sites (tuple): Cellules de k sites au format de
+            STT(protection_sites=...) ; None pour les fichiers stt_input/ de STT
+        match_radius_m (float): Distance max d'une visite à son lieu Home/Work
+        **stt_kwargs: Paramètres de STT (k, alpha, buffer, add_endpoints, ...)
+
+    Returns:
+        pd.DataFrame: Trajectoire tronquée (lng, lat, datetime, geometry)
+    """
+    # imports locaux : le reste du module ne dépend pas de la pile S-TT (skmob, rtree, fiona)
+    from skmob import TrajDataFrame
+    from stt_py import STT
+
+    trajectory = TrajDataFrame(
+        pd.DataFrame({'lon': df['lon'].to_numpy(), 'lat': df['lat'].to_numpy(), 'time': df['timestamp']}),
+        latitude='lat', longitude='lon', datetime='time'
+    )
+    stt = STT(
+        pcells_crs=pcells_crs, trajectory_crs='EPSG:4326',
+        sensitive_locations=home_work_sensitive_locations(stops, classified_stops, trajectory, match_radius_m),
+        protection_sites=protection_sites,
+        **stt_kwargs
+    )
+    return stt.truncate([trajectory])[0]
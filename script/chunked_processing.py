@@ -0,0 +1,298 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from load_and_preprocess import load_data_and_prepare, get_time_range
+from movingpandas_stop_detection import detect_stops_and_moves, build_moves_between_stops
+from detect_stops_and_analyze import summarize_points, merge_point_summaries
+from simplify_trajectory import TOLERANCES, time_bucket_mask
+
+# Colonnes conservées pour le rapport une fois la détection faite sur chaque fenêtre
+REPORT_COLUMNS = ['timestamp', 'lat', 'lon', 'time_diff_s', 'dist_m', 'speed_kmh', 'speed_kmh_smooth']
+
+
+def iter_time_windows(t_min, t_max, window_hours=24):
+    """
+    Découpe [t_min, t_max] en fenêtres consécutives de window_hours heures,
+    alignées sur minuit (heure locale de t_min). Génère des tuples (début, fin).
+
+    Les pas sont calendaires : les fenêtres d'un ou plusieurs jours vont de
+    minuit à minuit même aux changements d'heure (journées de 23 h ou 25 h),
+    et les fenêtres plus courtes redémarrent à chaque minuit (la dernière
+    fenêtre du jour s'arrête à minuit).
+    """
+    if window_hours % 24 == 0:
+        step = pd.DateOffset(days=window_hours // 24)
+        start = t_min.normalize()
+        while start <= t_max:
+            yield start, start + step
+            start = start + step
+        return
+
+    step = pd.Timedelta(hours=window_hours)
+    day = t_min.normalize()
+    while day <= t_max:
+        next_day = day + pd.DateOffset(days=1)
+        start = day
+        while start < next_day and start <= t_max:
+            end = min(start + step, next_day)
+            yield start, end
+            start = end
+        day = next_day
+
+
+def _aggregate_stop_groups(stops: pd.DataFrame, group: pd.Series) -> pd.DataFrame:
+    # un stop par groupe : bornes extrêmes, lat/lon pondérées par la durée des morceaux
+    stops = stops.assign(group=group.to_numpy(), w=stops['duration_s'].clip(lower=1))
+    stops['lat_w'] = stops['lat'] * stops['w']
+    stops['lon_w'] = stops['lon'] * stops['w']
+    agg = stops.groupby('group').agg(
+        start_time=('start_time', 'min'),
+        end_time=('end_time', 'max'),
+        lat_w=('lat_w', 'sum'),
+        lon_w=('lon_w', 'sum'),
+        w=('w', 'sum')
+    )
+    agg['duration_s'] = (agg['end_time'] - agg['start_time']).dt.total_seconds()
+    agg['lat'] = agg['lat_w'] / agg['w']
+    agg['lon'] = agg['lon_w'] / agg['w']
+
+    return agg[['start_time', 'end_time', 'duration_s', 'lat', 'lon']].reset_index(drop=True)
+
+
+def stitch_stops(stops: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fusionne les stops qui se chevauchent dans le temps : un même arrêt vu par
+    deux fenêtres voisines (grâce à la marge de recouvrement) ne donne qu'un stop.
+    lat/lon sont moyennées, pondérées par la durée de chaque morceau.
+    """
+    if stops.empty:
+        return stops
+
+    stops = stops.sort_values('start_time').reset_index(drop=True)
+    # nouveau groupe dès qu'un stop commence après la fin de tous les précédents
+    running_end = stops['end_time'].cummax().shift()
+    return _aggregate_stop_groups(stops, (stops['start_time'] > running_end).cumsum())
+
+
+def _window_trace(chunk: pd.DataFrame, in_core, chunk_stops: pd.DataFrame, bucket_s: float) -> pd.DataFrame:
+    # Trace allégée d'une fenêtre : premier point de chaque tranche de bucket_s
+    # secondes du cœur, dernier point du cœur, et points des bornes des stops
+    # de la fenêtre (marges comprises). Les moves construits sur ces points sont
+    # ceux de la trajectoire complète : build_moves_between_stops n'en lit que
+    # les premiers et derniers points entre deux stops.
+    columns = [c for c in REPORT_COLUMNS if c in chunk.columns]
+    core = chunk.loc[in_core, columns]
+    keep = time_bucket_mask(core['timestamp'], bucket_s)
+    if len(core) > 0:
+        keep[-1] = True
+    parts = [core[keep]]
+    if not chunk_stops.empty:
+        naive = chunk['timestamp'].dt.tz_localize(None) if chunk['timestamp'].dt.tz is not None else chunk['timestamp']
+        bounds = pd.concat([chunk_stops['start_time'], chunk_stops['end_time']])
+        parts.append(chunk.loc[naive.isin(bounds).to_numpy(), columns])
+    return pd.concat(parts)
+
+
+def detect_stops_and_moves_chunked(
+    engine,
+    pid,
+    window_hours: int = 24,
+    overlap_minutes: int = 60,
+    max_speed_kmh: float = 150,
+    min_duration_minutes: int = 5,
+    max_diameter_meters: float = 100,
+    min_move_duration_s: float = 30,
+    min_time_gap_s: float = 900,
+    trace_bucket_s: float = TOLERANCES['chunk_trace']
+):
+    """
+    Chargement, prétraitement et détection des stops fenêtre par fenêtre
+    (un jour, ou window_hours heures) : la mémoire de pointe est celle d'une
+    fenêtre, quelle que soit la longueur de la trajectoire.
+
+    Chaque fenêtre est chargée avec une marge de overlap_minutes de part et
+    d'autre : les vitesses et le lissage des points de la fenêtre sont alors
+    identiques à un traitement global, et un arrêt à cheval sur deux fenêtres
+    est vu par les deux puis recollé par stitch_stops. Les moves sont ensuite
+    construits entre les stops recollés, comme dans detect_stops_and_moves.
+
+    Seuls des résultats compacts sont conservés d'une fenêtre à l'autre : les
+    stops, le résumé des points (summarize_points, combiné exactement entre
+    fenêtres) et une trace allégée (un point par tranche de trace_bucket_s
+    secondes, plus les bornes des stops) pour la carte, les courbes et
+    histogrammes de vitesse et le clustering.
+
+    Returns:
+        df: trace allégée (colonnes REPORT_COLUMNS) pour le rapport
+        raw_stops: stops [start_time,end_time,duration_s,lat,lon] (tz-naive)
+        moves: moves entre stops (identiques à ceux de la trajectoire complète)
+        point_summary: résumé des points de toute la trajectoire (voir
+            generate_report.iter_full_report), None sans point
+    """
+    empty = pd.DataFrame(columns=REPORT_COLUMNS), pd.DataFrame(), pd.DataFrame(), None
+    t_min, t_max = get_time_range(engine, pid)
+    if t_min is None:
+        return empty
+
+    margin = pd.Timedelta(minutes=overlap_minutes)
+    traces, summaries, stops = [], [], []
+
+    for core_start, core_end in iter_time_windows(t_min, t_max, window_hours):
+        chunk = load_data_and_prepare(
+            engine, pid,
+            max_speed_kmh=max_speed_kmh,
+            start=core_start - margin,
+            end=core_end + margin
+        )
+        if chunk.empty:
+            continue
+
+        in_core = ((chunk['timestamp'] >= core_start) & (chunk['timestamp'] < core_end)).to_numpy()
+        summaries.append(summarize_points(chunk.loc[in_core]))
+
+        chunk_stops, _ = detect_stops_and_moves(
+            chunk,
+            min_duration_minutes=min_duration_minutes,
+            max_diameter_meters=max_diameter_meters,
+            min_move_duration_s=min_move_duration_s,
+            min_time_gap_s=min_time_gap_s
+        )
+        if not chunk_stops.empty:
+            # stops (tz-naive, heure locale) qui touchent le cœur de la fenêtre
+            naive_start = core_start.tz_localize(None)
+            naive_end = core_end.tz_localize(None)
+            touches_core = (chunk_stops['end_time'] >= naive_start) & (chunk_stops['start_time'] < naive_end)
+            chunk_stops = chunk_stops[touches_core]
+            stops.append(chunk_stops)
+        traces.append(_window_trace(chunk, in_core, chunk_stops, trace_bucket_s))
+        del chunk
+
+    if not traces:
+        return empty
+    df = (
+        pd.concat(traces, ignore_index=True)
+        .sort_values('timestamp', kind='stable')
+        .drop_duplicates('timestamp')
+        .reset_index(drop=True)
+    )
+    point_summary = merge_point_summaries(summaries)
+    if df.empty or not stops:
+        return df, pd.DataFrame(), pd.DataFrame(), point_summary
+    raw_stops = stitch_stops(pd.concat(stops, ignore_index=True))
+
+    track = df[['timestamp', 'lat', 'lon']].copy()
+    track['timestamp'] = track['timestamp'].dt.tz_localize(None)
+    moves = build_moves_between_stops(
+        track, raw_stops,
+        min_move_duration_s=min_move_duration_s,
+        min_time_gap_s=min_time_gap_s
+    )
+    return df, raw_stops, moves, point_summary
+
+
+def split_points(df: pd.DataFrame, n_chunks: int, split_by: str = 'gap', min_time_gap_s: float = 900) -> list:
+    """
+    Découpe un DataFrame GPS trié en au plus n_chunks morceaux contigus de tailles
+    voisines. Les coupures ne se font qu'aux trous temporels > min_time_gap_s
+    (split_by='gap') ou aux changements de jour (split_by='day').
+
+    Returns:
+        list[tuple[int, int]]: bornes (début, fin) en positions dans df
+    """
+    ts = df['timestamp']
+    if split_by == 'day':
+        days = ts.dt.normalize()
+        candidates = np.flatnonzero((days != days.shift()).to_numpy())[1:]
+    else:
+        candidates = np.flatnonzero((ts.diff().dt.total_seconds() > min_time_gap_s).to_numpy())
+
+    target = int(np.ceil(len(df) / max(n_chunks, 1)))
+    bounds, start = [], 0
+    for cut in candidates:
+        if cut - start >= target:
+            bounds.append((start, int(cut)))
+            start = int(cut)
+    bounds.append((start, len(df)))
+    return bounds
+
+
+def _detect_chunk(chunk: pd.DataFrame, params: dict, core_start, core_end):
+    # stops d'un morceau étendu de ses marges, limités à ceux qui touchent le cœur [core_start, core_end)
+    if len(chunk) < 2:
+        return pd.DataFrame()
+    stops, _ = detect_stops_and_moves(chunk, **params)
+    if stops.empty:
+        return stops
+    touches_core = (stops['end_time'] >= core_start) & (stops['start_time'] < core_end)
+    return stops[touches_core]
+
+
+def detect_stops_and_moves_parallel(
+    df: pd.DataFrame,
+    n_jobs: int = None,
+    split_by: str = 'gap',
+    overlap_minutes: int = 60,
+    min_duration_minutes: int = 5,
+    max_diameter_meters: float = 100,
+    min_move_duration_s: float = 30,
+    min_time_gap_s: float = 900
+):
+    """
+    Détection des stops d'un seul participant répartie sur plusieurs cœurs.
+
+    La trajectoire est coupée aux longs trous temporels (ou aux changements de
+    jour), chaque morceau passe dans detect_stops_and_moves dans un processus
+    séparé avec une marge de overlap_minutes de part et d'autre, comme les
+    fenêtres de detect_stops_and_moves_chunked : un arrêt à cheval sur une
+    coupure est vu en entier (ou au moins sur la durée de la marge) par les
+    deux morceaux voisins, puis recollé par stitch_stops. Les moves sont
+    reconstruits entre les stops fusionnés sur la trajectoire complète.
+
+    Returns:
+        raw_stops, moves: mêmes formats que detect_stops_and_moves
+    """
+    params = dict(
+        min_duration_minutes=min_duration_minutes,
+        max_diameter_meters=max_diameter_meters,
+        min_move_duration_s=min_move_duration_s,
+        min_time_gap_s=min_time_gap_s
+    )
+    n_jobs = n_jobs or os.cpu_count() or 1
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    bounds = split_points(df, n_jobs, split_by=split_by, min_time_gap_s=min_time_gap_s)
+    if len(bounds) == 1:
+        return detect_stops_and_moves(df, **params)
+
+    # cœur de chaque morceau en heure locale naïve (comme les stops), et morceau étendu de ses marges
+    ts = df['timestamp'].dt.tz_localize(None) if df['timestamp'].dt.tz is not None else df['timestamp']
+    ts = ts.to_numpy()
+    margin = np.timedelta64(int(overlap_minutes * 60), 's')
+    chunks, core_starts, core_ends = [], [], []
+    for a, b in bounds:
+        lo = np.searchsorted(ts, ts[a] - margin, side='left')
+        hi = np.searchsorted(ts, ts[b - 1] + margin, side='right')
+        chunks.append(df.iloc[lo:hi])
+        core_starts.append(pd.Timestamp(ts[a]))
+        core_ends.append(pd.Timestamp(ts[b]) if b < len(ts) else pd.Timestamp.max)
+
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as pool:
+        parts = list(pool.map(_detect_chunk, chunks, [params] * len(chunks), core_starts, core_ends))
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(), pd.DataFrame()
+
+    # un arrêt vu par deux morceaux voisins ne donne qu'un stop
+    raw_stops = stitch_stops(pd.concat(parts, ignore_index=True))
+
+    track = df[['timestamp', 'lat', 'lon']].copy()
+    if track['timestamp'].dt.tz is not None:
+        track['timestamp'] = track['timestamp'].dt.tz_localize(None)
+    moves = build_moves_between_stops(
+        track, raw_stops,
+        min_move_duration_s=min_move_duration_s,
+        min_time_gap_s=min_time_gap_s
+    )
+    return raw_stops, moves
@@ -1,3 +1,7 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
 import seaborn as sns
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -6,10 +10,15 @@ from io import BytesIO
 import numpy as np
 from matplotlib.patches import Patch
 
+from report_assets import encode_figure
+
+WEEKDAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
 def fig_to_base64(fig):
     buf = BytesIO()
     fig.savefig(buf, format='png', bbox_inches='tight')
     buf.seek(0)
+    plt.close(fig)
     return base64.b64encode(buf.read()).decode('utf-8')
 
 def enrich_time_columns(df):
@@ -22,18 +31,177 @@ def enrich_time_columns(df):
     df['is_weekend'] = df['dayofweek'] >= 5
     return df
 
-def plot_daily_hourly_speed_patterns(df):
-    df = df[df['timestamp'].notna()].copy()
-    df['hour'] = df['timestamp'].dt.hour
-    df['date'] = df['timestamp'].dt.date
-    df['dayofweek'] = df['timestamp'].dt.dayofweek
-    df['is_weekend'] = df['dayofweek'] >= 5
+# ---------------------------------------------------------------------------
+# Agrégats : petites structures (comptes d'histogramme, moyennes, pivots)
+# envoyées aux processus de rendu à la place du DataFrame GPS complet.
+# ---------------------------------------------------------------------------
+
+def histogram_counts(values, bins):
+    """(counts, edges) de np.histogram sur les valeurs non nulles de values."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.zeros(0), np.zeros(1)
+    return np.histogram(values, bins=bins)
+
+def build_time_cube(df) -> pd.DataFrame:
+    """
+    Cube d'agrégats temporels d'un participant, construit en une passe sur les
+    points GPS : une ligne par (date, heure) locale avec weekday, is_weekend,
+    count (points), speed_sum, speed_count (points avec vitesse) et speed_mean.
+    Toutes les figures temporelles du rapport se lisent dans ce cube.
+    """
+    ts = df['timestamp']
+    valid = ts.notna().to_numpy()
+    local = ts.dt.tz_localize(None) if ts.dt.tz is not None else ts
+    ns = local.to_numpy(dtype='datetime64[ns]').astype('int64')[valid]
+    speed = df['speed_kmh'].to_numpy(dtype=float)[valid]
+    has_speed = ~np.isnan(speed)
+
+    # clé entière jour × 24 + heure, sur l'heure murale locale
+    day_ns, hour_ns = 86_400 * 10**9, 3_600 * 10**9
+    keys, inverse = np.unique((ns // day_ns) * 24 + (ns % day_ns) // hour_ns, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+    speed_sum = np.bincount(inverse, weights=np.where(has_speed, speed, 0.0), minlength=len(keys))
+    speed_count = np.bincount(inverse, weights=has_speed, minlength=len(keys)).astype(int)
+
+    dates = pd.to_datetime(keys // 24, unit='D')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed_mean = np.where(speed_count > 0, speed_sum / np.maximum(speed_count, 1), np.nan)
+    return pd.DataFrame({
+        'date':        dates.date,
+        'hour':        (keys % 24).astype(int),
+        'weekday':     dates.day_name(),
+        'is_weekend':  dates.dayofweek >= 5,
+        'count':       count,
+        'speed_sum':   speed_sum,
+        'speed_count': speed_count,
+        'speed_mean':  speed_mean,
+    })
+
+def summarize_points(df) -> dict:
+    """
+    Statistiques des points GPS pour le résumé du rapport (cube date × heure,
+    nombre de points, distance, vitesses, pas d'échantillonnage, bornes
+    temporelles). Les résumés de fenêtres disjointes se combinent exactement
+    avec merge_point_summaries, sans garder les points.
+    """
+    speed = df['speed_kmh']
+    time_diff = df['time_diff_s'] if 'time_diff_s' in df.columns else pd.Series(dtype=float)
+    return {
+        'cube':            build_time_cube(df),
+        'nb_points':       len(df),
+        'dist_m':          float(df['dist_m'].sum()) if 'dist_m' in df.columns else 0.0,
+        'speed_sum':       float(speed.sum()),
+        'speed_count':     int(speed.count()),
+        'speed_max':       speed.max(),
+        'time_diff_sum':   float(time_diff.sum()),
+        'time_diff_count': int(time_diff.count()),
+        't_min':           df['timestamp'].min(),
+        't_max':           df['timestamp'].max(),
+    }
+
+def merge_point_summaries(summaries) -> dict:
+    """Résumé (summarize_points) de l'union de fenêtres temporelles disjointes."""
+    summaries = [s for s in summaries if s['nb_points'] > 0]
+    if not summaries:
+        return summarize_points(pd.DataFrame({'timestamp': pd.Series(dtype='datetime64[ns]'),
+                                              'speed_kmh': pd.Series(dtype=float)}))
+    cube = pd.concat([s['cube'] for s in summaries], ignore_index=True)
+    cube = cube.groupby(['date', 'hour', 'weekday', 'is_weekend'], as_index=False, sort=True)[
+        ['count', 'speed_sum', 'speed_count']].sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cube['speed_mean'] = np.where(cube['speed_count'] > 0,
+                                      cube['speed_sum'] / cube['speed_count'].clip(lower=1), np.nan)
+    merged = {key: sum(s[key] for s in summaries)
+              for key in ('nb_points', 'dist_m', 'speed_sum', 'speed_count', 'time_diff_sum', 'time_diff_count')}
+    merged.update(
+        cube=cube,
+        speed_max=pd.Series([s['speed_max'] for s in summaries]).max(),
+        t_min=min(s['t_min'] for s in summaries),
+        t_max=max(s['t_max'] for s in summaries),
+    )
+    return merged
+
+def _mean_speed_by(cube, key):
+    grouped = cube.groupby(key)[['speed_sum', 'speed_count']].sum()
+    return (grouped['speed_sum'] / grouped['speed_count'].where(grouped['speed_count'] > 0)).rename('speed_kmh')
+
+def hourly_mean_speed(cube):
+    """Vitesse moyenne par heure (toutes dates confondues)."""
+    return _mean_speed_by(cube, 'hour')
+
+def weekday_mean_speed(cube):
+    """Vitesse moyenne par jour de la semaine, du lundi au dimanche."""
+    return _mean_speed_by(cube, 'weekday').reindex(WEEKDAY_ORDER)
+
+def daily_hourly_speed(cube):
+    """Vitesse moyenne date × heure, séparée semaine / weekend."""
+    rows = cube[cube['speed_count'] > 0]
+    weekday = rows[~rows['is_weekend']].pivot(index='date', columns='hour', values='speed_mean')
+    weekend = rows[rows['is_weekend']].pivot(index='date', columns='hour', values='speed_mean')
+    return weekday, weekend
+
+def date_hour_counts(cube):
+    """Nombre de points GPS par date × heure."""
+    return cube.pivot(index='date', columns='hour', values='count').fillna(0).astype(int).sort_index()
+
+def date_hour_mean_speed(cube):
+    """Vitesse moyenne par date × heure."""
+    rows = cube[cube['speed_count'] > 0]
+    return rows.pivot(index='date', columns='hour', values='speed_mean').fillna(0).sort_index()
+
+def combined_confidence_scores(classified_stops: pd.DataFrame) -> pd.DataFrame:
+    """Score combiné (durée + fréquence) des lieux Home / Work, une ligne par lieu."""
+    df = classified_stops[classified_stops['place_type'].isin(['Home', 'Work'])].copy()
+    if df.empty:
+        return df
+
+    # Calcul du score temps
+    max_duration = df['duration_s'].max()
+    df['score_duree'] = df['duration_s'] / max_duration
 
+    # Calcul du score de fréquence (nb de jours distincts)
+    df['merged_days'] = df['merged_starts'].apply(lambda lst: set(pd.to_datetime(lst).date) if isinstance(lst, list) else set())
+    df['nb_days'] = df['merged_days'].apply(len)
+    max_days = df['nb_days'].max()
+    df['score_frequence'] = df['nb_days'] / max_days
+
+    # Score combiné pondéré (50% durée, 50% fréquence)
+    df['score_combine'] = ((df['score_duree'] + df['score_frequence']) / 2 * 100).round(1)
+
+    df['label'] = df.apply(lambda row: f"{row['place_type']} ({round(row['lat'], 3)}, {round(row['lon'], 3)})", axis=1)
+    return df[['label', 'place_type', 'score_combine']].reset_index(drop=True)
+
+# ---------------------------------------------------------------------------
+# Rendus : ne reçoivent que des agrégats, renvoient la figure matplotlib
+# ---------------------------------------------------------------------------
+
+def render_histogram(counts, edges, title=None, xlabel=None, ylabel=None):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    if len(counts):
+        ax.hist(edges[:-1], bins=edges, weights=counts)
+    ax.grid(True)
+    if title:
+        ax.set_title(title)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    return fig
+
+def render_bar(series, title):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    series.plot(kind='bar', ax=ax)
+    ax.set_title(title)
+    return fig
+
+def render_daily_hourly_speed(weekday_hourly, weekend_hourly):
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 6), sharex=True)
 
     # Partie semaine
-    for date, group in df[~df['is_weekend']].groupby('date'):
-        hourly = group.groupby('hour')['speed_kmh'].mean()
+    for date, hourly in weekday_hourly.iterrows():
+        hourly = hourly.dropna()
         if not hourly.empty:
             ax1.plot(hourly.index, hourly, label=str(date))
     ax1.set_title("Vitesse moyenne par heure – Semaine")
@@ -41,8 +209,8 @@ def plot_daily_hourly_speed_patterns(df):
     ax1.legend(loc='upper right', fontsize='x-small')
 
     # Partie weekend
-    for date, group in df[df['is_weekend']].groupby('date'):
-        hourly = group.groupby('hour')['speed_kmh'].mean()
+    for date, hourly in weekend_hourly.iterrows():
+        hourly = hourly.dropna()
         if not hourly.empty:
             ax2.plot(hourly.index, hourly, label=str(date))
     ax2.set_title("Vitesse moyenne par heure – Weekend")
@@ -51,87 +219,35 @@ def plot_daily_hourly_speed_patterns(df):
     ax2.legend(loc='upper right', fontsize='x-small')
 
     fig.tight_layout()
-    return fig_to_base64(fig)
-
-def plot_heatmap_date_hour(df):
-    # Préparation
-    df = df[df['timestamp'].notna()].copy()
-    df['hour'] = df['timestamp'].dt.hour
-    df['date'] = df['timestamp'].dt.date
-
-    # Grouper : nombre de points par date et heure
-    grouped = df.groupby(['date', 'hour']).size().unstack(fill_value=0)
-
-    # Trier les dates (si pas déjà)
-    grouped = grouped.sort_index()
+    return fig
 
-    # Création de la heatmap
-    fig, ax = plt.subplots(figsize=(14, max(6, len(grouped) * 0.35)))  # hauteur dynamique selon nbre de jours
-    sns.heatmap(grouped, cmap="Blues", annot=True, fmt='d', linewidths=.5, ax=ax)
-
-    ax.set_title("Heatmap des fréquences GPS – Date x Heure")
-    ax.set_xlabel("Heure")
-    ax.set_ylabel("Date")
-    plt.tight_layout()
-
-    return fig_to_base64(fig)
-
-def plot_heatmap_vitesse_date_hour(df):
-    df = df[df['timestamp'].notna() & df['speed_kmh'].notna()].copy()
-    df['hour'] = df['timestamp'].dt.hour
-    df['date'] = df['timestamp'].dt.date
-
-    # Grouper par date et heure → moyenne des vitesses
-    grouped = df.groupby(['date', 'hour'])['speed_kmh'].mean().unstack(fill_value=0)
-
-    # Trier les dates
-    grouped = grouped.sort_index()
-
-    # Créer la heatmap
+def render_date_hour_heatmap(grouped, title, cmap, fmt):
+    # hauteur dynamique selon nbre de jours
     fig, ax = plt.subplots(figsize=(14, max(6, len(grouped) * 0.35)))
-    sns.heatmap(grouped, cmap="YlOrRd", annot=True, fmt='.1f', linewidths=.5, ax=ax)
+    sns.heatmap(grouped, cmap=cmap, annot=True, fmt=fmt, linewidths=.5, ax=ax)
 
-    ax.set_title("Heatmap des vitesses moyennes – Date x Heure")
+    ax.set_title(title)
     ax.set_xlabel("Heure")
     ax.set_ylabel("Date")
-    plt.tight_layout()
+    fig.tight_layout()
 
-    return fig_to_base64(fig)
+    return fig
 
-def plot_combined_confidence_score(classified_stops: pd.DataFrame) -> str:
-    """
-    Génère un graphique du score de confiance combiné (durée + fréquence) pour les lieux Home / Work.
-    """
-    df = classified_stops[classified_stops['place_type'].isin(['Home', 'Work'])].copy()
+def render_confidence_scores(df):
     if df.empty:
-        return ""
-
-    # Calcul du score temps
-    max_duration = df['duration_s'].max()
-    df['score_duree'] = df['duration_s'] / max_duration
-
-    # Calcul du score de fréquence (nb de jours distincts)
-    df['merged_days'] = df['merged_starts'].apply(lambda lst: set(pd.to_datetime(lst).date) if isinstance(lst, list) else set())
-    df['nb_days'] = df['merged_days'].apply(len)
-    max_days = df['nb_days'].max()
-    df['score_frequence'] = df['nb_days'] / max_days
-
-    # Score combiné pondéré (50% durée, 50% fréquence)
-    df['score_combine'] = ((df['score_duree'] + df['score_frequence']) / 2 * 100).round(1)
-
-    df['label'] = df.apply(lambda row: f"{row['place_type']} ({round(row['lat'], 3)}, {round(row['lon'], 3)})", axis=1)
+        return None
 
-    # Plot
-    plt.figure(figsize=(10, max(4, 0.5 * len(df))))
+    fig, ax = plt.subplots(figsize=(10, max(4, 0.5 * len(df))))
     palette = {'Home': '#3498db', 'Work': '#9b59b6'}
 
-    ax = sns.barplot(
+    sns.barplot(
         data=df,
         x="score_combine",
         y="label",
         hue="place_type",
         dodge=False,
-        palette=palette
+        palette=palette,
+        ax=ax
     )
 
     for p in ax.patches:
@@ -140,86 +256,137 @@ def plot_combined_confidence_score(classified_stops: pd.DataFrame) -> str:
                     (width + 1, p.get_y() + p.get_height() / 2),
                     ha='left', va='center', fontsize=9, color='black')
 
-    plt.title("Score combiné Home / Work (durée + fréquence)", fontsize=14)
-    plt.xlabel("Score combiné (%)")
-    plt.ylabel("Lieu (type + coordonnées)")
-    plt.xlim(0, 110)
-    plt.legend(title="Type de lieu", loc="lower right")
-    sns.despine(left=True, bottom=True)
-    plt.tight_layout()
+    ax.set_title("Score combiné Home / Work (durée + fréquence)", fontsize=14)
+    ax.set_xlabel("Score combiné (%)")
+    ax.set_ylabel("Lieu (type + coordonnées)")
+    ax.set_xlim(0, 110)
+    ax.legend(title="Type de lieu", loc="lower right")
+    sns.despine(ax=ax, left=True, bottom=True)
+    fig.tight_layout()
 
-    buf = BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight")
-    buf.seek(0)
-    base64_img = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-
-    return base64_img
-
-def generate_figures(df, classified_stops, stops_summary=None):
-    figures_base64 = {}
-
-    df = enrich_time_columns(df)
-
-    fig1, ax1 = plt.subplots(figsize=(8, 4))
-    df['speed_kmh'].clip(upper=80).hist(bins=60, ax=ax1)
-    ax1.set_title("Distribution des vitesses (km/h)")
-    figures_base64['distribution_vitesse'] = fig_to_base64(fig1)
-
-    # —————————————————————————————————————————
-    # Histogrammes segmentés pour 0–3.5, 3.5–6.5 et 6.5–10 km/h
-    # —————————————————————————————————————————
-
-    # 0–3.5 km/h
-    fig2, ax2 = plt.subplots(figsize=(8, 4))
-    mask1 = (df['speed_kmh'] > 0) & (df['speed_kmh'] <= 3.5)
-    df.loc[mask1, 'speed_kmh'].hist(bins=np.linspace(0, 3.5, 15), ax=ax2)
-    ax2.set_title("Distribution des vitesses lentes (0–3,5 km/h)")
-    ax2.set_xlabel("Vitesse (km/h)")
-    ax2.set_ylabel("Nombre de points")
-    figures_base64['dist_vitesse_0_3_5'] = fig_to_base64(fig2)
-
-    # 3.5–6.5 km/h
-    fig6, ax6 = plt.subplots(figsize=(8, 4))
-    mask2 = (df['speed_kmh'] > 3.5) & (df['speed_kmh'] <= 6.5)
-    df.loc[mask2, 'speed_kmh'].hist(bins=np.linspace(3.5, 6.5, 15), ax=ax6)
-    ax6.set_title("Distribution des vitesses de marche (3,5–6,5 km/h)")
-    ax6.set_xlabel("Vitesse (km/h)")
-    ax6.set_ylabel("Nombre de points")
-    figures_base64['dist_vitesse_3_5_6_5'] = fig_to_base64(fig6)
-
-    # 6.5–10 km/h
-    fig7, ax7 = plt.subplots(figsize=(8, 4))
-    mask3 = (df['speed_kmh'] > 6.5) & (df['speed_kmh'] <= 10)
-    df.loc[mask3, 'speed_kmh'].hist(bins=np.linspace(6.5, 10, 15), ax=ax7)
-    ax7.set_title("Distribution des vitesses rapides (6,5–10 km/h)")
-    ax7.set_xlabel("Vitesse (km/h)")
-    ax7.set_ylabel("Nombre de points")
-    figures_base64['dist_vitesse_6_5_10'] = fig_to_base64(fig7)
-
-
-    fig3, ax3 = plt.subplots(figsize=(8, 4))
-    df[df['speed_kmh'] > 10]['speed_kmh'].hist(bins=30, ax=ax3)
-    figures_base64['distribution_vitesse_haute'] = fig_to_base64(fig3)
-
-    fig4, ax4 = plt.subplots(figsize=(8, 4))
-    df.groupby('hour')['speed_kmh'].mean().plot(kind='bar', ax=ax4)
-    ax4.set_title("Vitesse moyenne par heure")
-    figures_base64['vitesse_par_heure'] = fig_to_base64(fig4)
-
-    fig5, ax5 = plt.subplots(figsize=(8, 4))
-    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    df.groupby('weekday')['speed_kmh'].mean().reindex(weekday_order).plot(kind='bar', ax=ax5)
-    ax5.set_title("Vitesse moyenne par jour")
-    figures_base64['vitesse_par_jour'] = fig_to_base64(fig5)
-
-    figures_base64['vitesse_hebdo_horaire'] = plot_daily_hourly_speed_patterns(df)
-
-    figures_base64['heatmap_date_hour'] = plot_heatmap_date_hour(df)
-    figures_base64['heatmap_vitesse_date_hour'] = plot_heatmap_vitesse_date_hour(df)
+    return fig
+
+# ---------------------------------------------------------------------------
+# Fonctions historiques : agrégat + rendu dans le processus courant
+# ---------------------------------------------------------------------------
 
+def plot_daily_hourly_speed_patterns(df, cube=None):
+    cube = build_time_cube(df) if cube is None else cube
+    return fig_to_base64(render_daily_hourly_speed(*daily_hourly_speed(cube)))
+
+def plot_heatmap_date_hour(df, cube=None):
+    cube = build_time_cube(df) if cube is None else cube
+    return fig_to_base64(render_date_hour_heatmap(
+        date_hour_counts(cube), "Heatmap des fréquences GPS – Date x Heure", "Blues", 'd'
+    ))
+
+def plot_heatmap_vitesse_date_hour(df, cube=None):
+    cube = build_time_cube(df) if cube is None else cube
+    return fig_to_base64(render_date_hour_heatmap(
+        date_hour_mean_speed(cube), "Heatmap des vitesses moyennes – Date x Heure", "YlOrRd", '.1f'
+    ))
+
+def plot_combined_confidence_score(classified_stops: pd.DataFrame) -> str:
+    """
+    Génère un graphique du score de confiance combiné (durée + fréquence) pour les lieux Home / Work.
+    """
+    fig = render_confidence_scores(combined_confidence_scores(classified_stops))
+    return "" if fig is None else fig_to_base64(fig)
+
+# ---------------------------------------------------------------------------
+# Rendu parallèle
+# ---------------------------------------------------------------------------
+
+def figure_tasks(df, classified_stops=None, cube=None) -> dict:
+    """
+    Prépare les figures de vitesse : {nom: (fonction de rendu, arguments)}.
+    Les figures temporelles se lisent dans le cube (build_time_cube), les
+    histogrammes dans la seule colonne de vitesse ; les arguments ne
+    contiennent plus que des comptes et des moyennes.
+    """
+    cube = build_time_cube(df) if cube is None else cube
+    speed = df['speed_kmh'].to_numpy(dtype=float)
+    tasks = {
+        'distribution_vitesse': (render_histogram, (
+            *histogram_counts(np.minimum(speed, 80), 60), "Distribution des vitesses (km/h)")),
+        'dist_vitesse_0_3_5': (render_histogram, (
+            *histogram_counts(speed[(speed > 0) & (speed <= 3.5)], np.linspace(0, 3.5, 15)),
+            "Distribution des vitesses lentes (0–3,5 km/h)", "Vitesse (km/h)", "Nombre de points")),
+        'dist_vitesse_3_5_6_5': (render_histogram, (
+            *histogram_counts(speed[(speed > 3.5) & (speed <= 6.5)], np.linspace(3.5, 6.5, 15)),
+            "Distribution des vitesses de marche (3,5–6,5 km/h)", "Vitesse (km/h)", "Nombre de points")),
+        'dist_vitesse_6_5_10': (render_histogram, (
+            *histogram_counts(speed[(speed > 6.5) & (speed <= 10)], np.linspace(6.5, 10, 15)),
+            "Distribution des vitesses rapides (6,5–10 km/h)", "Vitesse (km/h)", "Nombre de points")),
+        'distribution_vitesse_haute': (render_histogram, (
+            *histogram_counts(speed[speed > 10], 30),)),
+        'vitesse_par_heure': (render_bar, (hourly_mean_speed(cube), "Vitesse moyenne par heure")),
+        'vitesse_par_jour': (render_bar, (weekday_mean_speed(cube), "Vitesse moyenne par jour")),
+        'vitesse_hebdo_horaire': (render_daily_hourly_speed, daily_hourly_speed(cube)),
+        'heatmap_date_hour': (render_date_hour_heatmap, (
+            date_hour_counts(cube), "Heatmap des fréquences GPS – Date x Heure", "Blues", 'd')),
+        'heatmap_vitesse_date_hour': (render_date_hour_heatmap, (
+            date_hour_mean_speed(cube), "Heatmap des vitesses moyennes – Date x Heure", "YlOrRd", '.1f')),
+    }
     if classified_stops is not None:
-        figures_base64['confidence_score_home_work'] = plot_combined_confidence_score(classified_stops)
+        tasks['confidence_score_home_work'] = (
+            render_confidence_scores, (combined_confidence_scores(classified_stops),))
+    return tasks
+
+def _init_figure_worker():
+    # backend sans affichage dans les processus de rendu
+    matplotlib.use('Agg')
+
+def _render_task(task, fmt='png'):
+    func, args = task
+    fig = func(*args)
+    if fig is None:
+        return "" if fmt == 'png' else None
+    return encode_figure(fig, fmt)
+
+class FigureRenderer:
+    """
+    Rendu des figures dans un pool de processus (backend Agg).
+
+    submit() lance le rendu dès que les agrégats sont prêts ; le rapport
+    continue pendant ce temps (carte, tableaux) et collect() récupère les
+    images à la fin. n_jobs=1 rend les figures dans le processus courant.
+    fmt : 'png' (base64) ou 'auto' (extension, octets) pour les fichiers
+    d'assets, voir report_assets.encode_figure.
+    """
 
-    plt.close('all')
-    return figures_base64
+    def __init__(self, n_jobs: int = None, fmt: str = 'png'):
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.fmt = fmt
+        self.pool = None
+        self.pending = {}
+
+    def submit(self, tasks: dict) -> None:
+        if self.n_jobs <= 1:
+            self.pending.update({name: _render_task(task, self.fmt) for name, task in tasks.items()})
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=min(self.n_jobs, len(tasks)), initializer=_init_figure_worker
+            )
+        for name, task in tasks.items():
+            self.pending[name] = self.pool.submit(_render_task, task, self.fmt)
+
+    def collect(self) -> dict:
+        try:
+            return {
+                name: res.result() if hasattr(res, 'result') else res
+                for name, res in self.pending.items()
+            }
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+def generate_figures(df, classified_stops, stops_summary=None, n_jobs=None, cube=None):
+    renderer = FigureRenderer(n_jobs)
+    renderer.submit(figure_tasks(df, classified_stops, cube=cube))
+    return renderer.collect()
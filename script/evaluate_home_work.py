@@ -10,6 +10,8 @@ import numpy as np
 import matplotlib.dates as mdates
 from plotly.subplots import make_subplots
 
+from simplify_trajectory import TOLERANCES, time_bucket_mean
+
 def fig_to_base64(fig):
     buf = BytesIO()
     fig.savefig(buf, format='png', bbox_inches='tight')
@@ -44,29 +46,30 @@ def evaluate_home_work_classification(classified_stops):
     results['nombre_lieux_par_type'] = type_counts.to_dict()
 
     # 2. Fréquence de visite : on compte le nombre d’intervalles par lieu
-    df['nb_intervalles'] = df['merged_starts'].apply(lambda x: len(x) if isinstance(x, list) else 1)
+    is_list = df['merged_starts'].map(type).eq(list)
+    df['nb_intervalles'] = df['merged_starts'].str.len().where(is_list, 1).astype(int)
     freq_summary = df.groupby('place_type')['nb_intervalles'].describe()
     results['frequence_par_type'] = freq_summary.to_dict()
 
-    # 3. Horaires typiques : extraire l’heure de chaque timestamp dans merged_starts
-    time_stats = []
-    for _, row in df.iterrows():
-        starts = row['merged_starts']
-        if isinstance(starts, list):
-            for ts in starts:
-                h = pd.to_datetime(ts, utc=True).tz_convert('Europe/Paris').hour
-                time_stats.append({
-                    'place_type': row['place_type'],
-                    'hour': h
-                })
-
-    df_time = pd.DataFrame(time_stats)
-    if not df_time.empty:
+    # 3. Horaires typiques : une ligne par intervalle (explode), conversion de
+    #    toutes les dates en une fois, puis comptage par (type, heure)
+    starts = df.loc[is_list, ['place_type', 'merged_starts']].explode('merged_starts')
+    starts = starts.dropna(subset=['merged_starts'])
+    if not starts.empty:
+        hours = pd.to_datetime(starts['merged_starts'], utc=True, format='ISO8601').dt.tz_convert('Europe/Paris').dt.hour
+        df_time = (
+            starts.assign(hour=hours.to_numpy())
+            .groupby(['place_type', 'hour'], sort=False)
+            .size()
+            .rename('count')
+            .reset_index()
+        )
         plt.figure(figsize=(10, 4))
         sns.histplot(
             data=df_time,
             x='hour',
             hue='place_type',
+            weights='count',
             multiple='stack',
             bins=24
         )
@@ -84,7 +87,54 @@ def evaluate_home_work_classification(classified_stops):
 
     return results
 
-def plot_rolling_speed(df, stops, moves, window_min=10) -> str:
+def label_place_types(timestamps: pd.Series, stops: pd.DataFrame) -> np.ndarray:
+    """
+    Type de lieu de chaque instant : place_type du stop qui le contient
+    (bornes incluses), 'Move' sinon.
+
+    Jointure d'intervalles triée : merge_asof associe à chaque instant le
+    dernier stop commencé, puis on vérifie qu'il n'est pas déjà terminé. Si
+    des stops se chevauchent, le stop commencé avant et encore en cours (fin
+    cumulée maximale) est retenu.
+    """
+    labels = np.full(len(timestamps), 'Move', dtype=object)
+    stops = stops.dropna(subset=['start_time', 'end_time'])
+    if stops.empty or len(timestamps) == 0:
+        return labels
+
+    def to_paris(col):
+        col = pd.to_datetime(col)
+        col = col.dt.tz_localize('Europe/Paris') if col.dt.tz is None else col.dt.tz_convert('Europe/Paris')
+        return col.astype('datetime64[ns, Europe/Paris]')
+
+    s = pd.DataFrame({
+        'start_time': to_paris(stops['start_time']),
+        'end_time':   to_paris(stops['end_time']),
+        'place_type': stops['place_type'].to_numpy(),
+    }).sort_values('start_time', kind='stable').reset_index(drop=True)
+
+    # stop le plus tardif à se terminer parmi ceux déjà commencés
+    end = s['end_time'].to_numpy()
+    run_end = s['end_time'].cummax()
+    run_pos = np.maximum.accumulate(np.where(end == run_end.to_numpy(), np.arange(len(s)), 0))
+    s['run_end'] = run_end
+    s['run_place'] = s['place_type'].to_numpy()[run_pos]
+
+    t = pd.DataFrame({'timestamp': to_paris(pd.Series(timestamps).reset_index(drop=True)),
+                      'pos': np.arange(len(timestamps))})
+    t = t.dropna(subset=['timestamp']).sort_values('timestamp', kind='stable')
+    joined = pd.merge_asof(t, s, left_on='timestamp', right_on='start_time', direction='backward')
+
+    ts = joined['timestamp']
+    own = (joined['end_time'] >= ts).to_numpy()
+    running = (joined['run_end'] >= ts).to_numpy() & ~own
+    pos = joined['pos'].to_numpy()
+    labels[pos[own]] = joined['place_type'].to_numpy()[own]
+    labels[pos[running]] = joined['run_place'].to_numpy()[running]
+    return labels
+
+def plot_rolling_speed(df, stops, moves, window_min=10, bucket_s=TOLERANCES['speed_plot'],
+                       include_plotlyjs='cdn') -> str:
     """
     Deux sous-graphiques :
     - Haut : vitesse brute + lissée colorée par type de lieu.
@@ -94,15 +144,11 @@ def plot_rolling_speed(df, stops, moves, window_min=10) -> str:
     df = df.copy()
     df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_convert("Europe/Paris")
     df = df.set_index('timestamp').sort_index()
-    speed_1min = df['speed_kmh'].resample('1T').mean().interpolate()
+    speed_1min = time_bucket_mean(df.index, df['speed_kmh'], bucket_s, name='speed_kmh').interpolate()
     speed_smooth = speed_1min.rolling(window=window_min, min_periods=1, center=True).mean()
     dfm = speed_smooth.reset_index().rename(columns={'speed_kmh':'speed_kmh_smooth'})
     
-    intervals = pd.IntervalIndex.from_arrays(stops['start_time'], stops['end_time'], closed='both')
-    s_place = pd.Series(stops['place_type'].values, index=intervals)
-    dfm['place_type'] = dfm['timestamp'].apply(
-        lambda ts: s_place[s_place.index.contains(ts)].iloc[0] if not s_place[s_place.index.contains(ts)].empty else 'Move'
-    )
+    dfm['place_type'] = label_place_types(dfm['timestamp'], stops)
 
     moves['start_time'] = pd.to_datetime(moves['start_time'], utc=True).dt.tz_convert("Europe/Paris")
     moves['end_time'] = pd.to_datetime(moves['end_time'], utc=True).dt.tz_convert("Europe/Paris")
@@ -144,20 +190,29 @@ def plot_rolling_speed(df, stops, moves, window_min=10) -> str:
                 visible=True
             ))
 
-    # --- Subplot 2 : Timeline des moves ---
-    for _, mv in moves.iterrows():
+    # --- Subplot 2 : Timeline des moves (une seule trace, segments séparés par None) ---
+    if total_moves:
+        n = total_moves
+        x = np.empty(3 * n, dtype=object)
+        x[0::3] = moves['start_time'].to_numpy()
+        x[1::3] = moves['end_time'].to_numpy()
+        x[2::3] = None
+        y = np.tile([1, 1, None], n)
+        hover = (
+            "<b>Move</b><br>"
+            + moves['origin_type'].astype(str) + " → " + moves['destination_type'].astype(str) + "<br>"
+            + "Durée: " + (moves['duration_s'] / 60).map('{:.1f}'.format) + " min<br>"
+            + "Distance: " + moves['dist_m'].map('{:.1f}'.format) + " m"
+        ).to_numpy()
+        text = np.repeat(hover, 3)
+        text[2::3] = None
         fig.add_trace(go.Scatter(
-            x=[mv['start_time'], mv['end_time']],
-            y=[1, 1],
+            x=x, y=y, text=text,
             mode='lines',
             line=dict(color='orange', width=8),
-            name=f"{mv['origin_type']} → {mv['destination_type']}",
-            hovertemplate=(
-                f"<b>Move</b><br>"
-                f"{mv['origin_type']} → {mv['destination_type']}<br>"
-                f"Durée: {mv['duration_s']/60:.1f} min<br>"
-                f"Distance: {mv['dist_m']:.1f} m<extra></extra>"
-            ),
+            name="Moves",
+            hovertemplate="%{text}<extra></extra>",
+            connectgaps=False,
             showlegend=True
         ), row=2, col=1)
 
@@ -174,7 +229,7 @@ def plot_rolling_speed(df, stops, moves, window_min=10) -> str:
         height=700
     )
 
-    return fig.to_html(full_html=False, include_plotlyjs='cdn')
+    return fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs)
 
 
 # def plot_rolling_speed_with_place(df_all, stops_df, window_min=10, by_day=False):
@@ -269,5 +324,5 @@ def plot_rolling_speed(df, stops, moves, window_min=10) -> str:
 #             margin=dict(l=50, r=50, t=50, b=50),
 #             legend=dict(title="Jour", orientation="h", y=1.02, x=1, xanchor="right"),
 #         )
-#         return fig.to_html(full_html=False, include_plotlyjs='cdn')
+#         return fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs)
 
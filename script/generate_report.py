@@ -1,35 +1,220 @@
 from datetime import datetime
 import folium
 from folium.plugins import HeatMap, MiniMap
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
-from detect_stops_and_analyze import generate_figures
-from movingpandas_stop_detection import detect_stops_and_moves
+from detect_stops_and_analyze import FigureRenderer, figure_tasks, summarize_points
 from scikit_mobility import detect_stops_with_skmob
 from evaluate_home_work import plot_rolling_speed
 from dbscan_clustering              import cluster_stops_dbscan
 from split_moves_stops import build_moves_summary
+from report_assets import localize_cdn_urls
+from report_writer import FIGURE, TABLE_SECTION, paged_table_chunks
+from simplify_trajectory import (
+    TOLERANCES, simplify_latlon, distance_thin_mask, time_bucket_mask, cap_mask, evenly_spaced_indices
+)
+
+# Mode carte allégée : plafonds de points affichés
+LIGHT_MAX_MARKERS_PER_LAYER = 2000
+LIGHT_MAX_HEAT_POINTS = 20000
+
+def _simplify_latlon(latlon, tolerance_m):
+    """Simplifie (Douglas-Peucker) une polyligne [[lat, lon], ...] à tolerance_m près."""
+    return latlon[simplify_latlon(latlon[:, 0], latlon[:, 1], tolerance_m)]
+
+def _thin_latlon(latlon, min_dist_m, max_points):
+    """Points espacés d'au moins min_dist_m le long du trajet, au plus max_points."""
+    return latlon[cap_mask(distance_thin_mask(latlon[:, 0], latlon[:, 1], min_dist_m), max_points)]
+
+def _geojson_feature(geometry_type, latlon, **properties):
+    coords = np.round(np.asarray(latlon)[..., ::-1], 6).tolist()
+    return {"type": "Feature", "properties": properties,
+            "geometry": {"type": geometry_type, "coordinates": coords}}
+
+def _style_from_properties(feature):
+    p = feature['properties']
+    return {
+        'color': p.get('color', 'blue'),
+        'fillColor': p.get('color', 'blue'),
+        'weight': p.get('weight', 2),
+        'opacity': p.get('opacity', 0.7),
+        'fillOpacity': p.get('fill_opacity', 0.6),
+        'radius': p.get('radius', 3),
+    }
+
+def _geojson_layer(features, popup_field=None, tooltip_field=None):
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        style_function=_style_from_properties,
+        marker=folium.CircleMarker(radius=3, fill=True),
+        popup=folium.GeoJsonPopup(fields=[popup_field], labels=False) if popup_field else None,
+        tooltip=folium.GeoJsonTooltip(fields=[tooltip_field], labels=False) if tooltip_field else None,
+    )
+
+def _add_light_point_layers(m, df, stops_summary, max_markers, tolerance_m):
+    """
+    Équivalent allégé des calques 1) à 4) : polylignes simplifiées, un objet
+    GeoJSON par calque, nombre de marqueurs et de points de heatmap plafonné.
+    """
+    points = df[['lat', 'lon']].dropna()
+    latlon = points.to_numpy()
+
+    # 1) Trajet complet simplifié
+    if len(latlon):
+        fg_trajet_global = folium.FeatureGroup(name="Trajet complet", show=True)
+        folium.PolyLine(_simplify_latlon(latlon, tolerance_m).tolist(),
+                        color='black', weight=3, opacity=0.6).add_to(fg_trajet_global)
+        fg_trajet_global.add_to(m)
+
+    # 2) Un calque GeoJSON par jour : ligne simplifiée + points échantillonnés
+    if 'timestamp' in df.columns and len(latlon):
+        days = pd.to_datetime(df.loc[points.index, 'timestamp'], utc=True).dt.tz_convert("Europe/Paris").dt.date
+        for day, group in points.groupby(days):
+            coords = group.to_numpy()
+            features = []
+            line = _simplify_latlon(coords, TOLERANCES['map_day'])
+            if len(line) >= 2:
+                features.append(_geojson_feature("LineString", line, color='blue', weight=2, opacity=0.6))
+            markers = _thin_latlon(coords, TOLERANCES['map_markers'], max_markers)
+            features.extend(
+                _geojson_feature("Point", p, color='blue', radius=2, fill_opacity=0.4) for p in markers
+            )
+            fg_jour = folium.FeatureGroup(name=f"Trajet {day} ({len(markers)}/{len(coords)} pts)", show=False)
+            _geojson_layer(features).add_to(fg_jour)
+            fg_jour.add_to(m)
+
+    # 3) Heatmap : un point par tranche de temps, la densité reste pondérée par la durée
+    if len(latlon):
+        fg_heat = folium.FeatureGroup(name="Heatmap Densité", show=False)
+        if 'timestamp' in df.columns:
+            keep = time_bucket_mask(pd.to_datetime(df.loc[points.index, 'timestamp'], utc=True), TOLERANCES['heatmap'])
+        else:
+            keep = np.ones(len(latlon), dtype=bool)
+        heat = latlon[cap_mask(keep, LIGHT_MAX_HEAT_POINTS)]
+        HeatMap(heat.tolist(), radius=10, blur=15).add_to(fg_heat)
+        fg_heat.add_to(m)
+
+    # 4) Stops bruts : les plus longs d'abord si le plafond est atteint
+    if stops_summary is not None and not stops_summary.empty:
+        stops = stops_summary.copy()
+        stops['day'] = pd.to_datetime(stops['start_time']).dt.date
+        duration_min = stops['duration_s'] / 60
+        stops['radius'] = (duration_min / 2).clip(lower=3, upper=10)
+        stops['color'] = np.where(duration_min < 5, 'green', np.where(duration_min < 15, 'orange', 'red'))
+        stops['info'] = (
+            "<b>Début :</b> " + stops['start_time'].astype(str) + "<br>"
+            "<b>Fin :</b> " + stops['end_time'].astype(str) + "<br>"
+            "<b>Durée :</b> " + (stops['duration_s'] // 60).astype(int).astype(str) + " min "
+            + (stops['duration_s'] % 60).astype(int).astype(str) + " sec"
+        )
+
+        def stop_features(subset):
+            subset = subset.nlargest(max_markers, 'duration_s') if len(subset) > max_markers else subset
+            return [
+                _geojson_feature("Point", (r.lat, r.lon), color=r.color, radius=r.radius,
+                                 fill_opacity=0.85, info=r.info)
+                for r in subset.itertuples()
+            ], len(subset)
+
+        features, shown = stop_features(stops)
+        fg_all = folium.FeatureGroup(name=f"Tous les stops ({shown}/{len(stops)})", show=True)
+        _geojson_layer(features, popup_field='info').add_to(fg_all)
+        fg_all.add_to(m)
+
+        for day, group in stops.groupby('day'):
+            features, shown = stop_features(group)
+            fg_day = folium.FeatureGroup(name=f"Stops du {day} ({shown}/{len(group)})", show=False)
+            _geojson_layer(features, popup_field='info').add_to(fg_day)
+            fg_day.add_to(m)
+
+def _add_light_move_layers(m, moves_tagged, moves_snapped, max_markers):
+    """
+    Équivalent allégé des calques de moves : un objet GeoJSON par calque
+    (segments + extrémités), plafonné à max_markers moves.
+    """
+    if moves_tagged is not None and not moves_tagged.empty:
+        shown = moves_tagged.iloc[evenly_spaced_indices(len(moves_tagged), max_markers)]
+        features = []
+        for mv in shown.itertuples():
+            info = (
+                f"<b>Durée :</b> {mv.duration_s/60:.1f} min<br>"
+                f"<b>Dist :</b> {mv.dist_m:.0f} m<br>"
+                f"<b>Trajet :</b> {mv.origin_type} → {mv.destination_type}"
+            )
+            features.append(_geojson_feature(
+                "LineString", [(mv.lat_origin, mv.lon_origin), (mv.lat_dest, mv.lon_dest)],
+                color='orange', weight=2, opacity=0.7, info=info))
+            features.append(_geojson_feature("Point", (mv.lat_origin, mv.lon_origin), color='darkorange', info=info))
+            features.append(_geojson_feature("Point", (mv.lat_dest, mv.lon_dest), color='red', info=info))
+        fg_moves = folium.FeatureGroup(name=f"Moves ({len(shown)}/{len(moves_tagged)})", show=True)
+        _geojson_layer(features, tooltip_field='info').add_to(fg_moves)
+        fg_moves.add_to(m)
 
-def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, moves_tagged, moves_snapped):
+    if moves_snapped is not None and not moves_snapped.empty:
+        shown = moves_snapped.iloc[evenly_spaced_indices(len(moves_snapped), max_markers)]
+        features = []
+        for mv in shown.itertuples():
+            info = f"Recalé vers {mv.snapped_origin_type}/{mv.snapped_destination_type}"
+            features.append(_geojson_feature(
+                "LineString", [(mv.lat_origin, mv.lon_origin), (mv.lat_dest, mv.lon_dest)],
+                color='purple', weight=3, opacity=0.9, info=info))
+            features.append(_geojson_feature(
+                "Point", (mv.lat_origin, mv.lon_origin),
+                color='purple' if mv.snapped_origin_type else 'darkorange', radius=4, fill_opacity=0.8, info=info))
+            features.append(_geojson_feature(
+                "Point", (mv.lat_dest, mv.lon_dest),
+                color='purple' if mv.snapped_destination_type else 'red', radius=4, fill_opacity=0.8, info=info))
+        fg_snapped = folium.FeatureGroup(name=f"Moves recalés ({len(shown)}/{len(moves_snapped)})", show=True)
+        _geojson_layer(features, tooltip_field='info').add_to(fg_snapped)
+        fg_snapped.add_to(m)
+
+def _figure_sources(figs, pid, assets=None, asset_files=None):
+    """{nom: src de <img>} : URI data base64, ou fichier d'asset ajouté à asset_files."""
+    if not assets:
+        return {name: f"data:image/png;base64,{b64}" for name, b64 in figs.items()}
+    sources = {}
+    for name, encoded in figs.items():
+        if encoded is None:
+            sources[name] = ""
+            continue
+        ext, data = encoded
+        path = f"{assets}/{pid}/{name}.{ext}"
+        if asset_files is not None:
+            asset_files[path] = data
+        sources[name] = path
+    return sources
+
+def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, moves_tagged, moves_snapped,
+                             light=False, max_markers_per_layer=LIGHT_MAX_MARKERS_PER_LAYER,
+                             simplify_tolerance_m=TOLERANCES['map_path']):
     """
     Retourne le HTML d’une carte Folium pour un DataFrame donné.
     final_stops correspond aux arrêts déjà fusionnés / classifiés (Home/Work/autre).
+
+    light=True : trajets, stops bruts et moves sont émis en un objet GeoJSON par
+    calque, les polylignes simplifiées à simplify_tolerance_m près et le nombre
+    de marqueurs par calque plafonné à max_markers_per_layer, pour que la taille
+    de la carte ne dépende plus du nombre brut de points GPS.
     """
     center_lat = df['lat'].mean()
     center_lon = df['lon'].mean()
     m = folium.Map(location=[center_lat, center_lon], zoom_start=13, tiles='cartodbpositron')
     m.add_child(MiniMap(toggle_display=True))
 
+    if light:
+        _add_light_point_layers(m, df, stops_summary, max_markers_per_layer, simplify_tolerance_m)
+
     # 1) Trajet complet
-    if not df[['lat', 'lon']].dropna().empty:
+    if not light and not df[['lat', 'lon']].dropna().empty:
         path = df[['lat', 'lon']].dropna().values.tolist()
         fg_trajet_global = folium.FeatureGroup(name="Trajet complet", show=True)
         folium.PolyLine(path, color='black', weight=3, opacity=0.6).add_to(fg_trajet_global)
         fg_trajet_global.add_to(m)
 
     # 2) Calque par jour
-    if 'timestamp' in df.columns:
+    if not light and 'timestamp' in df.columns:
         df['day'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_convert("Europe/Paris").dt.date
         for day, group in df.groupby('day'):
             fg_jour = folium.FeatureGroup(name=f"Trajet {day}", show=False)
@@ -46,14 +231,15 @@ def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, move
             fg_jour.add_to(m)
 
     # 3) Heatmap densité
-    heat_data = df[['lat', 'lon']].dropna().values.tolist()
+    heat_data = [] if light else df[['lat', 'lon']].dropna().values.tolist()
     if heat_data:
         fg_heat = folium.FeatureGroup(name="Heatmap Densité", show=False)
         HeatMap(heat_data, radius=10, blur=15).add_to(fg_heat)
         fg_heat.add_to(m)
 
     # 4) Stops bruts
-    if stops_summary is not None and not stops_summary.empty:
+    if not light and stops_summary is not None and not stops_summary.empty:
+        stops_summary = stops_summary.copy()
         stops_summary['day'] = pd.to_datetime(stops_summary['start_time']).dt.date
         fg_all = folium.FeatureGroup(name=f"Tous les stops ({len(stops_summary)})", show=True)
         for _, row in stops_summary.iterrows():
@@ -212,7 +398,10 @@ def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, move
 
     # fg_merged.add_to(m)
     # ───── 7) Déplacements (moves) ──────────────────────────────────────────
-    if moves_tagged is not None and not moves_tagged.empty:
+    if light:
+        _add_light_move_layers(m, moves_tagged, moves_snapped, max_markers_per_layer)
+
+    if not light and moves_tagged is not None and not moves_tagged.empty:
         fg_moves = folium.FeatureGroup(name=f"Moves ({len(moves_tagged)})", show=True)
         for _, mv in moves_tagged.iterrows():
             # tracé de la ligne du move
@@ -246,7 +435,7 @@ def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, move
 
         fg_moves.add_to(m)
 
-    if moves_snapped is not None and not moves_snapped.empty:
+    if not light and moves_snapped is not None and not moves_snapped.empty:
         fg_snapped = folium.FeatureGroup(name=f"Moves recalés ({len(moves_snapped)})", show=True)
         for _, mv in moves_snapped.iterrows():
             folium.PolyLine(
@@ -277,7 +466,7 @@ def generate_interactive_map(df, stops_summary, grouped_stops, final_stops, move
     folium.LayerControl(collapsed=False).add_to(m)
     return m.get_root().render()
 
-def render_segment_report(
+def iter_segment_report(
     df,
     stops_summary,
     grouped_stops,
@@ -289,9 +478,9 @@ def render_segment_report(
     segment_end
 ):
     """
-    Retourne le HTML (string) pour un segment donné, SANS graphiques de vitesse.
+    Génère, morceau par morceau, le HTML d'un segment donné, SANS graphiques de vitesse.
     """
-    html = f"""
+    yield f"""
     <hr style="margin: 40px 0;">
     <h2 id="segment_{segment_start}_{segment_end}">Segment {segment_start} → {segment_end}</h2>
     """
@@ -306,7 +495,7 @@ def render_segment_report(
     total_duration_min = round(total_duration_s / 60, 1)
     total_distance_km = round(df['dist_m'].sum() / 1000, 2) if 'dist_m' in df.columns else None
 
-    html += f"""
+    yield f"""
     <ul>
         <li><strong>Durée totale d'enregistrement :</strong> {total_recording} (du {start_time.date()} au {end_time.date()})</li>
         <li><strong>Nombre de points GPS dans le segment :</strong> {nb_points}</li>
@@ -317,102 +506,69 @@ def render_segment_report(
     """
 
     # Carte interactive du segment
-    map_html = generate_interactive_map(df, stops_summary, grouped_stops, final_stops)
-    html += f"""
-    <h3>Carte interactive</h3>
-    {map_html}
-    """
+    yield "<h3>Carte interactive</h3>\n"
+    yield generate_interactive_map(df, stops_summary, grouped_stops, final_stops, None, None)
 
     # Stops détectés
+    segment_id = f"segment_{segment_start}_{segment_end}"
     if stops_summary is not None:
-        html += """
-        <h3>Stops détectés</h3>
-        <div class="table-container">
-        """
-        html += stops_summary.to_html(index=False)
-        html += "</div>"
-
-    # # Stops regroupés (bounding box)
-    # if grouped_stops is not None and not grouped_stops.empty:
-    #     # 1) Retirer le tz pour éviter le décalage sur to_html()
-    #     df_grp = grouped_stops.copy()
-    #     df_grp['start_time'] = pd.to_datetime(df_grp['start_time']).dt.tz_localize(None)
-    #     df_grp['end_time']   = pd.to_datetime(df_grp['end_time']).dt.tz_localize(None)
-
-    #     # 2) Afficher la table complète
-    #     html += """
-    #     <h3>Stops regroupés</h3>
-    #     <div class="table-container">
-    #     """
-    #     html += df_grp[[
-    #         'start_time','end_time','duration_s','lat','lon','group_size'
-    #     ]].to_html(index=False)
-    #     html += "</div>\n"
+        yield from _table_section("Stops détectés", paged_table_chunks(stops_summary, f"{segment_id}_stops"))
 
     # Lieux classifiés Home/Work/Autre
     if final_stops is not None and 'place_type' in final_stops.columns:
-        html += """
-        <h3>Lieux classifiés : Home / Work / Autre</h3>
-        <div class="table-container">
-        """
-        html += final_stops[['lat','lon','place_type']].to_html(index=False)
-        html += "</div>"
+        yield from _table_section(
+            "Lieux classifiés : Home / Work / Autre",
+            paged_table_chunks(final_stops[['lat','lon','place_type']], f"{segment_id}_lieux")
+        )
 
     # Évaluation Home/Work pour ce segment
     if evaluation:
-        html += """
+        yield """
         <h3>Évaluation des lieux Home / Work</h3>
         <ul>
         """
         for k, v in evaluation['nombre_lieux_par_type'].items():
-            html += f"<li><strong>{k}</strong> : {v} lieu(x)</li>"
-        html += "</ul>\n<ul>\n"
+            yield f"<li><strong>{k}</strong> : {v} lieu(x)</li>"
+        yield "</ul>\n<ul>\n"
         for k, v in evaluation['duree_cumulee_minutes'].items():
-            html += f"<li><strong>{k}</strong> : {v:.1f} min</li>"
-        html += "</ul>\n"
+            yield f"<li><strong>{k}</strong> : {v:.1f} min</li>"
+        yield "</ul>\n"
         if 'graph_hourly_distribution' in evaluation:
-            html += """
+            yield """
             <h4>Répartition horaire des intervalles (Home/Work)</h4>
             """
-            html += f"<img src=\"data:image/png;base64,{evaluation['graph_hourly_distribution']}\" width=\"700\"/><br>"
-
-    # # Correspondance « autres » vs activités
-    # if matched_unknowns_df is not None and not matched_unknowns_df.empty:
-    #     html += """
-    #     <h3>Correspondance des lieux "autres" avec les activités détectées</h3>
-    #     <div class="table-container">
-    #     """
-    #     html += matched_unknowns_df[['start_time','end_time','duration_s','lat','lon','matched_activity']].to_html(index=False)
-    #     html += "</div>"
-    return html
+            yield f"<img src=\"data:image/png;base64,{evaluation['graph_hourly_distribution']}\" width=\"700\"/><br>"
 
-
-def generate_full_report(
-    df_all,
-    stops_summary_all,
-    merged_grouped_stops,
-    final_stops,
-    final_evaluation_merged,
-    #matched_unknowns_df,
-    moves_tagged,
-    moves_snapped,
-    pid=None,
-    autres_with_distances=None,
-):
+def render_segment_report(*args, **kwargs):
     """
-    Construit la section « Résultat final » à append dans le fichier HTML.
-    On y inclut :
-      1) Une carte globale
-      2) Le tableau des stops regroupés (avant classification finale)
-      3) Le tableau des lieux classifiés finaux (après fusion close stops)
-      4) L’évaluation Home/Work finale
-      5) Les graphiques “Distribution des vitesses”, “Vitesse par jour/heure”, etc.
+    Retourne le HTML (string) pour un segment donné, SANS graphiques de vitesse
+    (mêmes arguments que iter_segment_report).
     """
-    html = "<hr style=\"margin: 40px 0;\">\n"
-    html += "<h2>Résultat final </h2>\n"
-
-    # Résumé global
-    html += """
+    return "".join(iter_segment_report(*args, **kwargs))
+
+
+# Sections du rapport final, dans l'ordre ; chacune peut être sautée (skip_sections)
+REPORT_SECTIONS = (
+    'resume',              # résumé global
+    'carte',               # carte interactive globale
+    'stops_bruts',         # stops bruts MovingPandas
+    'lieux_classifies',    # lieux Home / Work / Autre + DBSCAN
+    'lieux_finaux',        # stops bruts affectés au lieu classifié le plus proche
+    'distances_autres',    # distances des lieux "autres" à Home/Work
+    'vitesse_rolling',     # vitesse lissée et timeline des moves (plotly)
+    'evaluation',          # évaluation finale Home / Work
+    'moves',               # résumé des moves
+    'moves_recales',       # moves recalés vers Home/Work
+    'graphiques',          # graphiques de vitesse
+)
+
+def _section_resume(r):
+    summary = r['summary']
+    merged_grouped_stops = r['merged_grouped_stops']
+    points_per_day = r['cube'].groupby('date')['count'].sum()
+    total_duration = summary['t_max'] - summary['t_min']
+
+    yield """
     <h3>Résumé global</h3>
     <ul>
         <li><strong>Nombre total de points :</strong> {nb_points}</li>
@@ -424,68 +580,65 @@ def generate_full_report(
         <li><strong>Nombre de jours couverts :</strong> {nb_jours} jour(s)</li>
         <li><strong>Jours analysés :</strong><ul>
     """.format(
-        nb_points=len(df_all),
+        nb_points=summary['nb_points'],
         nb_stops=len(merged_grouped_stops),
         durée_stops=merged_grouped_stops['duration_s'].sum() / 60,
-        durée_moves=(df_all['timestamp'].max() - df_all['timestamp'].min()).total_seconds() / 60 - merged_grouped_stops['duration_s'].sum() / 60,
-        distance_km=df_all['dist_m'].sum() / 1000,
-        total_duration=df_all['timestamp'].max() - df_all['timestamp'].min(),
-        start=df_all['timestamp'].min().date(),
-        end=df_all['timestamp'].max().date(),
-        nb_jours=len(df_all['timestamp'].dt.date.unique())
+        durée_moves=total_duration.total_seconds() / 60 - merged_grouped_stops['duration_s'].sum() / 60,
+        distance_km=summary['dist_m'] / 1000,
+        total_duration=total_duration,
+        start=summary['t_min'].date(),
+        end=summary['t_max'].date(),
+        nb_jours=len(points_per_day)
     )
 
     # Ajouter la liste des jours
-    for day, count in df_all.groupby(df_all['timestamp'].dt.date).size().items():
-        html += f"<li>{day} : {count} points</li>"
-    html += "</ul></li>"
+    yield "".join(f"<li>{day} : {count} points</li>" for day, count in points_per_day.items())
+    yield "</ul></li>"
 
     # Statistiques vitesse et fréquence
-    html += f"""
-        <li><strong>Vitesse moyenne :</strong> {df_all['speed_kmh'].mean():.2f} km/h</li>
-        <li><strong>Vitesse maximale :</strong> {df_all['speed_kmh'].max():.2f} km/h</li>
-        <li><strong>Nombre moyen de points par jour :</strong> {int(len(df_all)/len(df_all['timestamp'].dt.date.unique()))}</li>
-        <li><strong>Fréquence moyenne d’échantillonnage :</strong> un point toutes les {df_all['time_diff_s'].mean():.1f} secondes</li>
+    speed_mean = summary['speed_sum'] / summary['speed_count'] if summary['speed_count'] else float('nan')
+    time_diff_mean = summary['time_diff_sum'] / summary['time_diff_count'] if summary['time_diff_count'] else float('nan')
+    yield f"""
+        <li><strong>Vitesse moyenne :</strong> {speed_mean:.2f} km/h</li>
+        <li><strong>Vitesse maximale :</strong> {summary['speed_max']:.2f} km/h</li>
+        <li><strong>Nombre moyen de points par jour :</strong> {int(summary['nb_points']/len(points_per_day))}</li>
+        <li><strong>Fréquence moyenne d’échantillonnage :</strong> un point toutes les {time_diff_mean:.1f} secondes</li>
     </ul>
     """
-    # juste avant de construire la carte globale
-    stops_summary_all, raw_moves_all = detect_stops_and_moves(
-        df_all,
-        min_duration_minutes=5,
-        max_diameter_meters=100,
-        min_move_duration_s=30,
-        min_time_gap_s=900
-    )
-    # stops_summary_all = detect_stops_with_skmob(
-    #     df_all,
-    #     epsilon_m=75,      # rayon en mètres
-    #     min_time_s=15*60 
-    # )
-
-    # 1) Carte interactive globale
-    html += "<h3>Carte interactive globale</h3>\n"
-    map_global = generate_interactive_map(df_all, stops_summary_all, merged_grouped_stops, final_stops, moves_tagged, moves_snapped)
-    html += map_global
-
-    # 1bis) Stops bruts MovingPandas
-    html += """
-    <h3>Stops bruts détectés par MovingPandas </h3>
-    <div class="table-container">
-    """
-    html += stops_summary_all[['start_time','end_time','duration_s','lat','lon']].to_html(index=False)
-    html += "</div>\n"
 
+def _section_carte(r):
+    yield "<h3>Carte interactive globale</h3>\n"
+    map_global = generate_interactive_map(
+        r['df_all'], r['stops_summary_all'], r['merged_grouped_stops'], r['final_stops'],
+        r['moves_tagged'], r['moves_snapped'], light=r['light_map']
+    )
+    if r['assets']:
+        map_global = localize_cdn_urls(map_global, r['assets'])
+    yield map_global
+
+def _paged_table(r, table_id, df):
+    # aperçu paginé ; données complètes en fichiers annexes du rapport
+    return paged_table_chunks(df, table_id, asset_files=r['asset_files'], sidecar_dir=r['sidecar_dir'])
+
+def _table_section(title, table):
+    yield TABLE_SECTION.substitute(title=title)
+    yield from table
+    yield "</div>\n"
+
+def _section_stops_bruts(r):
+    yield from _table_section(
+        "Stops bruts détectés par MovingPandas ",
+        _paged_table(r, 'stops_bruts', r['stops_summary_all'][['start_time','end_time','duration_s','lat','lon']])
+    )
 
-    # 3) Lieux classifiés: Home / Work / Autre + DBSCAN
-    html += """
-    <h3>Lieux classifiés: Home / Work / Autre + DBSCAN</h3>
-    <div class="table-container">
-    """
-    html += final_stops[['lat','lon','place_type']].to_html(index=False)
-    html += "</div>\n"
+def _section_lieux_classifies(r):
+    yield from _table_section(
+        "Lieux classifiés: Home / Work / Autre + DBSCAN",
+        _paged_table(r, 'lieux_classifies', r['final_stops'][['lat','lon','place_type']])
+    )
 
-        # ─── 1bis) Stops bruts MovingPandas → affectation place_type ───
-    html += "<h3>Lieux classifiés finaux </h3>\n"
+def _section_lieux_finaux(r):
+    stops_summary_all, final_stops = r['stops_summary_all'], r['final_stops']
 
     # 1) GeoDataFrames
     gdf_raw = gpd.GeoDataFrame(
@@ -513,122 +666,165 @@ def generate_full_report(
     )
 
     # 4) Affichage du tableau
-    html += '<div class="table-container">\n'
-    html += joined[[
+    yield "<h3>Lieux classifiés finaux </h3>\n"
+    yield '<div class="table-container">\n'
+    yield from _paged_table(r, 'lieux_finaux', joined[[
         'start_time','end_time','duration_s','lat','lon','place_type','distance_m'
-    ]].to_html(index=False)
-    html += "</div>\n"
+    ]])
+    yield "</div>\n"
 
-    # … code précédent …
-    joined = gpd.sjoin_nearest(
-        gdf_raw,
-        gdf_final[['place_type','geometry']],
-        how='left',
-        max_distance=150,
-        distance_col='distance_m'
-    )
-
-    # On retransforme en tz-naive et on garde juste les colonnes utiles
-    joined = joined.drop(columns='geometry').copy()
-    joined['start_time'] = pd.to_datetime(joined['start_time']).dt.tz_localize(None)
-    joined['end_time']   = pd.to_datetime(joined['end_time']).dt.tz_localize(None)
-
-    # 3bis) Distances Home/Work pour les lieux "autres"
-    html += """
+def _section_distances_autres(r):
+    yield """
     <h3>Distances entre les lieux "autres" et Home/Work</h3>
     <p><em>Les colonnes indiquent la distance (en mètres) entre chaque lieu "autre" et les lieux Home/Work détectés. 
-    La colonne <b>suspect</b> indique si le lieu est proche (moins de 150 m) de Home ou Work.</em></p>
+    La colonne <b>suspect</b> indique si le lieu est proche (moins de 150 m) de Home ou Work.</em></p>
     <div class="table-container">
     """
-    html += autres_with_distances.to_html(index=False)
-    html += "</div>\n"
-
-    # # 2) Stops regroupés (tous segments, avant classification)
-    # html += """
-    # <h3>Stops regroupés </h3>
-    # <div class="table-container">
-    # """
-    # html += merged_grouped_stops[['start_time','end_time','duration_s','lat','lon','group_size']].to_html(index=False)
-    # html += "</div>\n"
-
-    # # 6) Correspondance des lieux "autres" avec les activités détectées
-    # if matched_unknowns_df is not None and not matched_unknowns_df.empty:
-    #     html += """
-    #     <h3>Correspondance des lieux "autres" avec les activités </h3>
-    #     <div class="table-container">
-    #     """
-    #     html += matched_unknowns_df[['start_time','end_time','duration_s','lat','lon','matched_activity']].to_html(index=False)
-    #     html += "</div>\n"
-
-    html += plot_rolling_speed(df_all, final_stops,moves_tagged, window_min=10)
-
-    #html += plot_rolling_speed_with_place(df_all, final_merged_stops, window_min=10)
-
-    # 4) Évaluation finale Home/Work
-    html += """
+    yield from _paged_table(r, 'distances_autres', r['autres_with_distances'])
+    yield "</div>\n"
+
+def _section_vitesse_rolling(r):
+    yield plot_rolling_speed(r['df_all'], r['final_stops'], r['moves_tagged'], window_min=10,
+                             include_plotlyjs=False if r['assets'] else 'cdn')
+
+def _section_evaluation(r):
+    evaluation = r['final_evaluation_merged']
+    yield """
     <h3>Évaluation finale Home / Work </h3>
     <ul>
     """
-    for k, v in final_evaluation_merged['nombre_lieux_par_type'].items():
-        html += f"<li><strong>{k}</strong> : {v} lieu(x)</li>\n"
-    html += "</ul>\n<ul>\n"
-    for k, v in final_evaluation_merged['duree_cumulee_minutes'].items():
-        html += f"<li><strong>{k}</strong> : {v:.1f} min</li>\n"
-    html += "</ul>\n"
-    
-    html += "<h3>Résumé des déplacements (Moves)</h3>\n"
-    html += moves_tagged.to_html(index=False)
-
-    html += "<h3>Moves recalés (vers Home/Work)</h3>\n"
-    snapped = moves_snapped[moves_snapped['snapped']]
+    for k, v in evaluation['nombre_lieux_par_type'].items():
+        yield f"<li><strong>{k}</strong> : {v} lieu(x)</li>\n"
+    yield "</ul>\n<ul>\n"
+    for k, v in evaluation['duree_cumulee_minutes'].items():
+        yield f"<li><strong>{k}</strong> : {v:.1f} min</li>\n"
+    yield "</ul>\n"
+
+def _section_moves(r):
+    yield "<h3>Résumé des déplacements (Moves)</h3>\n"
+    yield from _paged_table(r, 'moves', r['moves_tagged'])
+
+def _section_moves_recales(r):
+    yield "<h3>Moves recalés (vers Home/Work)</h3>\n"
+    snapped = r['moves_snapped'][r['moves_snapped']['snapped']]
     if not snapped.empty:
-        html += snapped[['start_time','end_time','origin_type','destination_type',
-                        'snapped_origin_type','snapped_destination_type']].to_html(index=False)
+        yield from _paged_table(r, 'moves_recales', snapped[['start_time','end_time','origin_type','destination_type',
+                                                             'snapped_origin_type','snapped_destination_type']])
     else:
-        html += "<p><em>Aucun move recalé.</em></p>"
-
-    # 5) Graphiques « Vitesse » finaux (appel à generate_figures)
-    # On regénère uniquement la partie “analyse de vitesse” sur le DataFrame complet
-    figs = generate_figures(df_all, final_stops, None)
-    # html += "<h3>Vitesse moyenne par heure – Semaine vs Weekend (par type de lieu)</h3>"
-    # html += f"<img src=\"data:image/png;base64,{figs['vitesse_semaine_weekend_par_lieu']}\" width=\"700\"/><br>"
-    #    a) Distribution des vitesses
-    html += "<h3>Distribution des vitesses</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['distribution_vitesse']}\" width=\"700\"/><br>"
-
-    html += "<h3>Vitesses lentes (0–3,5 km/h)</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['dist_vitesse_0_3_5']}\" width=\"700\"/><br>"
-
-    html +="<h3>Vitesses de marche (3,5–6,5 km/h)</h3>"
-    html +=f"<img src=\"data:image/png;base64,{figs['dist_vitesse_3_5_6_5']}\" width=\"700\"/><br>"
-
-    html +="<h3>Vitesses rapides (6,5–10 km/h)</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['dist_vitesse_6_5_10']}\" width=\"700\"/><br>"
-
-    #    c) Vitesses > 10 km/h
-    html += "<h3>Vitesses > 10 km/h</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['distribution_vitesse_haute']}\" width=\"700\"/><br>"
-
-    #    d) Vitesse moyenne par heure
-    html += "<h3>Vitesse moyenne par heure</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['vitesse_par_heure']}\" width=\"700\"/><br>"
-
-    #    e) Vitesse moyenne par jour
-    html += "<h3>Vitesse moyenne par jour</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['vitesse_par_jour']}\" width=\"700\"/><br>"
-
-    #    f) Répartition hebdo vs weekend
-    html += "<h3>Répartition des vitesses moyennes – Semaine vs Weekend</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['vitesse_hebdo_horaire']}\" width=\"700\"/><br>"
-
-    #    g) Heatmap Fréquence GPS – Date × Heure
-    html += "<h3>Heatmap Fréquence GPS – Date × Heure</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['heatmap_date_hour']}\" width=\"900\"/><br>"
-
-    #    h) Heatmap Vitesses moyennes – Date × Heure
-    html += "<h3>Heatmap des vitesses moyennes – Date × Heure</h3>"
-    html += f"<img src=\"data:image/png;base64,{figs['heatmap_vitesse_date_hour']}\" width=\"900\"/><br>"
+        yield "<p><em>Aucun move recalé.</em></p>"
+
+# (nom de la figure, titre, largeur) des graphiques de vitesse, dans l'ordre du rapport
+SPEED_FIGURES = (
+    ('distribution_vitesse',       "Distribution des vitesses", 700),
+    ('dist_vitesse_0_3_5',         "Vitesses lentes (0–3,5 km/h)", 700),
+    ('dist_vitesse_3_5_6_5',       "Vitesses de marche (3,5–6,5 km/h)", 700),
+    ('dist_vitesse_6_5_10',        "Vitesses rapides (6,5–10 km/h)", 700),
+    ('distribution_vitesse_haute', "Vitesses > 10 km/h", 700),
+    ('vitesse_par_heure',          "Vitesse moyenne par heure", 700),
+    ('vitesse_par_jour',           "Vitesse moyenne par jour", 700),
+    ('vitesse_hebdo_horaire',      "Répartition des vitesses moyennes – Semaine vs Weekend", 700),
+    ('heatmap_date_hour',          "Heatmap Fréquence GPS – Date × Heure", 900),
+    ('heatmap_vitesse_date_hour',  "Heatmap des vitesses moyennes – Date × Heure", 900),
+)
+
+def _section_graphiques(r):
+    # rendus en parallèle depuis le début du rapport
+    figs = _figure_sources(r['figures'].collect(), r['pid'], r['assets'], r['asset_files'])
+    for name, title, width in SPEED_FIGURES:
+        yield FIGURE.substitute(title=title, src=figs[name], width=width)
+
+_SECTION_BUILDERS = {
+    'resume':           _section_resume,
+    'carte':            _section_carte,
+    'stops_bruts':      _section_stops_bruts,
+    'lieux_classifies': _section_lieux_classifies,
+    'lieux_finaux':     _section_lieux_finaux,
+    'distances_autres': _section_distances_autres,
+    'vitesse_rolling':  _section_vitesse_rolling,
+    'evaluation':       _section_evaluation,
+    'moves':            _section_moves,
+    'moves_recales':    _section_moves_recales,
+    'graphiques':       _section_graphiques,
+}
+
+def iter_full_report(
+    df_all,
+    stops_summary_all,
+    merged_grouped_stops,
+    final_stops,
+    final_evaluation_merged,
+    moves_tagged,
+    moves_snapped,
+    pid=None,
+    autres_with_distances=None,
+    light_map=False,
+    figure_jobs=None,
+    assets=None,
+    asset_files=None,
+    skip_sections=(),
+    point_summary=None,
+):
+    """
+    Génère la section « Résultat final » morceau par morceau, section après
+    section (voir REPORT_SECTIONS) : chaque section n'est calculée qu'au moment
+    où elle est consommée, et les tableaux sont émis par blocs de lignes. Avec
+    report_writer.stream_report, le rapport est écrit au fil de l'eau.
+
+    light_map=True génère la carte globale en mode allégé (voir generate_interactive_map).
+    figure_jobs : nombre de processus de rendu des graphiques (1 = rendu séquentiel).
+    assets : répertoire d'assets du run relatif au rapport (ex. "assets/<run_id>").
+    Les graphiques y sont alors écrits en fichiers (SVG ou PNG, le plus compact),
+    ajoutés à asset_files {chemin: octets}, et plotly.js / Leaflet sont chargés
+    depuis les copies locales au lieu du CDN ou d'images base64 en ligne.
+    Les tableaux longs sont plafonnés à un aperçu paginé (report_writer.paged_table_chunks),
+    leurs données complètes ajoutées à asset_files quand il est fourni.
+    skip_sections : noms de REPORT_SECTIONS à ne pas produire.
+    point_summary : statistiques des points (summarize_points) quand df_all
+    n'est qu'une trace allégée (mode par fenêtres) ; le résumé et les graphiques
+    temporels en sont tirés, la carte et les histogrammes de vitesse de df_all.
+    """
+    unknown = set(skip_sections) - set(REPORT_SECTIONS)
+    if unknown:
+        raise ValueError(f"Sections de rapport inconnues : {sorted(unknown)}")
+    sections = [name for name in REPORT_SECTIONS if name not in skip_sections]
+
+    # Le cube date × heure est construit une seule fois pour le résumé et les graphiques.
+    summary = point_summary if point_summary is not None else summarize_points(df_all)
+    r = dict(
+        df_all=df_all, stops_summary_all=stops_summary_all,
+        merged_grouped_stops=merged_grouped_stops, final_stops=final_stops,
+        final_evaluation_merged=final_evaluation_merged,
+        moves_tagged=moves_tagged, moves_snapped=moves_snapped,
+        pid=pid, autres_with_distances=autres_with_distances,
+        light_map=light_map, assets=assets, asset_files=asset_files,
+        # fichiers annexes (graphiques, tableaux complets) : assets du run, sinon à côté du rapport
+        sidecar_dir=f"{assets}/{pid}" if assets else f"{pid}_tables",
+        summary=summary, cube=summary['cube'], figures=None,
+    )
 
-    # 6) Fin du fichier HTML
-    html += "</body>\n</html>"
-    return html
+    # Les graphiques de vitesse sont rendus en parallèle pendant la construction
+    # de la carte et des tableaux, puis récupérés dans la dernière section.
+    if 'graphiques' in sections:
+        r['figures'] = FigureRenderer(figure_jobs, fmt='auto' if assets else 'png')
+        r['figures'].submit(figure_tasks(df_all, final_stops, cube=r['cube']))
+
+    try:
+        yield "<hr style=\"margin: 40px 0;\">\n"
+        yield "<h2>Résultat final </h2>\n"
+        for name in sections:
+            yield from _SECTION_BUILDERS[name](r)
+    finally:
+        if r['figures'] is not None:
+            r['figures'].close()
+
+def generate_full_report(*args, **kwargs):
+    """
+    Construit la section « Résultat final » en une seule chaîne HTML
+    (mêmes arguments que iter_full_report). On y inclut :
+      1) Une carte globale
+      2) Le tableau des stops regroupés (avant classification finale)
+      3) Le tableau des lieux classifiés finaux (après fusion close stops)
+      4) L’évaluation Home/Work finale
+      5) Les graphiques “Distribution des vitesses”, “Vitesse par jour/heure”, etc.
+    """
+    return "".join(iter_full_report(*args, **kwargs))
@@ -0,0 +1,288 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+
+def shard_of(pid, num_shards: int) -> int:
+    """
+    Shard d'un participant : crc32 de son identifiant modulo num_shards
+    (stable d'une machine et d'un lancement à l'autre, contrairement à hash()).
+    """
+    return zlib.crc32(str(pid).encode('utf-8')) % num_shards
+
+
+def _write_json_atomic(path: str, payload: dict) -> None:
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+class JobManifest:
+    """
+    Manifeste de traitement d'une cohorte partagé entre plusieurs machines via
+    un système de fichiers commun.
+
+    Arborescence du répertoire `root` :
+        manifest.json       participants et shard attribué (écrit une seule fois)
+        locks/{pid}.{gen}.lock  verrou de génération gen (création exclusive)
+        status/{pid}.json   statut final : 'done' ou 'failed' (+ erreur)
+
+    Un worker réclame d'abord les participants de son shard ; avec steal=True il
+    reprend ensuite ceux des autres shards restés en attente, ainsi que les
+    verrous expirés (worker arrêté en cours de route) au-delà de lease_s.
+
+    Le verrou courant d'un participant est celui de plus haute génération. Un
+    verrou expiré de génération g est repris en créant la génération g + 1
+    (O_EXCL : un seul worker gagne) ; aucun worker ne déplace ni ne supprime
+    le verrou courant d'un autre. Une fois le participant terminé, le verrou
+    est conservé mais vieilli (bail échu), pour que les générations restent
+    croissantes.
+    """
+
+    def __init__(self, root: str, shard: int = 0, num_shards: int = 1,
+                 lease_s: float = 4 * 3600, worker_id: str = None):
+        self.root = root
+        self.shard = shard
+        self.num_shards = num_shards
+        self.lease_s = lease_s
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.lock_dir = os.path.join(root, "locks")
+        self.status_dir = os.path.join(root, "status")
+        self.participants = {}
+        self.run_id = None
+        self._held = {}  # pid -> génération du verrou pris par ce worker
+
+    # ------------------------------------------------------------------ #
+    # Création / chargement
+    # ------------------------------------------------------------------ #
+    def init(self, pids: list, run_id: str = None) -> dict:
+        """
+        Crée le manifeste pour la liste de participants s'il n'existe pas encore,
+        sinon relit celui créé par un autre nœud. Retourne {pid: shard}.
+
+        Le run_id du nœud qui crée le manifeste y est enregistré : tous les
+        nœuds le reprennent (self.run_id), une cohorte = un seul run_id.
+        """
+        os.makedirs(self.lock_dir, exist_ok=True)
+        os.makedirs(self.status_dir, exist_ok=True)
+
+        if not os.path.exists(self.manifest_path):
+            payload = {
+                'created_at':   time.strftime('%Y-%m-%d %H:%M:%S'),
+                'created_by':   self.worker_id,
+                'num_shards':   self.num_shards,
+                'run_id':       run_id,
+                'participants': {str(pid): shard_of(pid, self.num_shards) for pid in pids},
+            }
+            tmp = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, indent=1)
+            try:
+                # os.link échoue si le manifeste existe déjà : un seul nœud le crée
+                os.link(tmp, self.manifest_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp)
+
+        return self.load()
+
+    def load(self) -> dict:
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload['num_shards'] != self.num_shards:
+            raise ValueError(
+                f"Le manifeste {self.manifest_path} a été créé avec "
+                f"{payload['num_shards']} shards (et non {self.num_shards})"
+            )
+        self.participants = payload['participants']
+        self.run_id = payload.get('run_id')
+        return self.participants
+
+    # ------------------------------------------------------------------ #
+    # Statuts
+    # ------------------------------------------------------------------ #
+    def _lock_path(self, pid, gen: int) -> str:
+        return os.path.join(self.lock_dir, f"{pid}.{gen}.lock")
+
+    def _lock_gens(self, pid) -> list:
+        # générations de verrou existantes d'un participant, par ordre croissant
+        prefix, gens = f"{pid}.", []
+        for name in os.listdir(self.lock_dir):
+            if name.startswith(prefix) and name.endswith('.lock') and name[len(prefix):-5].isdigit():
+                gens.append(int(name[len(prefix):-5]))
+        return sorted(gens)
+
+    def _current_lock(self, pid):
+        # (génération, chemin) du verrou courant, (None, None) si jamais réclamé
+        gens = self._lock_gens(pid)
+        return (gens[-1], self._lock_path(pid, gens[-1])) if gens else (None, None)
+
+    def _is_stale(self, lock: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(lock) >= self.lease_s
+        except FileNotFoundError:
+            return True
+
+    def _status_path(self, pid) -> str:
+        return os.path.join(self.status_dir, f"{pid}.json")
+
+    def status(self, pid) -> str:
+        """'done', 'failed', 'running' ou 'pending'."""
+        if os.path.exists(self._status_path(pid)):
+            with open(self._status_path(pid), 'r', encoding='utf-8') as f:
+                return json.load(f)['status']
+        gen, lock = self._current_lock(pid)
+        if gen is not None and not self._is_stale(lock):
+            return 'running'
+        return 'pending'
+
+    def summary(self) -> dict:
+        """Nombre de participants par statut."""
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for pid in self.participants:
+            counts[self.status(pid)] += 1
+        return counts
+
+    def mark_done(self, pid, **info) -> None:
+        self._finish(pid, 'done', info)
+
+    def mark_failed(self, pid, error) -> None:
+        self._finish(pid, 'failed', {'error': str(error)})
+
+    def _finish(self, pid, status: str, info: dict) -> None:
+        _write_json_atomic(self._status_path(pid), {
+            'status':      status,
+            'worker':      self.worker_id,
+            'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **info,
+        })
+        self._release(pid)
+
+    def _release(self, pid) -> None:
+        # Le verrou de ce worker est vieilli s'il est toujours le verrou courant
+        # (réclamable aussitôt, génération conservée), supprimé s'il a été
+        # dépassé par celui d'un autre worker après expiration du bail
+        gen = self._held.pop(pid, None)
+        if gen is None:
+            return
+        lock = self._lock_path(pid, gen)
+        try:
+            if self._current_lock(pid)[0] == gen:
+                os.utime(lock, (0, 0))
+            else:
+                os.remove(lock)
+        except FileNotFoundError:
+            pass
+
+    def heartbeat(self, pid) -> None:
+        """Prolonge le bail du verrou d'un participant en cours de traitement."""
+        gen = self._held.get(pid)
+        if gen is None:
+            return
+        try:
+            os.utime(self._lock_path(pid, gen))
+        except FileNotFoundError:
+            pass
+
+    def keep_alive(self, pid, interval_s: float = None):
+        """
+        Context manager qui appelle heartbeat(pid) en tâche de fond toutes les
+        interval_s secondes (défaut : un quart du bail) pendant le traitement,
+        pour qu'un participant long ne soit pas repris par un autre worker.
+        """
+        return _Heartbeat(self, pid, interval_s or max(1.0, self.lease_s / 4))
+
+    # ------------------------------------------------------------------ #
+    # Réclamation
+    # ------------------------------------------------------------------ #
+    def _try_claim(self, pid, retry_failed: bool = False) -> bool:
+        gen, lock = self._current_lock(pid)
+        if gen is not None and not self._is_stale(lock):
+            return False
+        new_gen = 0 if gen is None else gen + 1
+        if not self._create_lock(pid, new_gen):
+            return False
+        self._held[pid] = new_gen
+
+        # Un worker parti d'un état plus ancien (génération déjà dépassée) a pu
+        # créer un verrou qui n'est pas le courant : il y renonce
+        if self._current_lock(pid)[0] != new_gen:
+            self._release(pid)
+            return False
+        # Verrous des générations précédentes, dépassés
+        for old in self._lock_gens(pid):
+            if old < new_gen:
+                try:
+                    os.remove(self._lock_path(pid, old))
+                except FileNotFoundError:
+                    pass
+
+        # Un autre worker a pu terminer entre le test de statut et la prise du verrou
+        status_path = self._status_path(pid)
+        if os.path.exists(status_path):
+            if retry_failed and self.status(pid) == 'failed':
+                os.remove(status_path)
+                return True
+            self._release(pid)
+            return False
+        return True
+
+    def _create_lock(self, pid, gen: int) -> bool:
+        # Création exclusive du verrou de génération gen : False si un autre worker l'a déjà créé
+        try:
+            fd = os.open(self._lock_path(pid, gen), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{self.worker_id} {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        return True
+
+    def claim_next(self, steal: bool = False, retry_failed: bool = False):
+        """
+        Réclame le prochain participant à traiter, ou None s'il n'en reste aucun.
+
+        Args:
+            steal (bool): reprendre aussi les participants des autres shards
+            retry_failed (bool): retenter les participants en échec
+        """
+        own = [pid for pid, shard in self.participants.items() if shard == self.shard]
+        others = [pid for pid, shard in self.participants.items() if shard != self.shard] if steal else []
+
+        for pid in own + others:
+            if os.path.exists(self._status_path(pid)):
+                if not retry_failed or self.status(pid) != 'failed':
+                    continue
+            if self._try_claim(pid, retry_failed=retry_failed):
+                return pid
+        return None
+
+
+class _Heartbeat:
+    """Thread de fond prolongeant le bail d'un verrou (voir JobManifest.keep_alive)."""
+
+    def __init__(self, manifest: JobManifest, pid, interval_s: float):
+        self.manifest = manifest
+        self.pid = pid
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.manifest.heartbeat(self.pid)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._stop.set()
+        self._thread.join()
+        return False
@@ -7,18 +7,26 @@ import geopandas as gpd
 from skmob import TrajDataFrame
 from skmob.preprocessing import filtering
 
-def load_data_and_prepare(engine, participant_id, max_speed_kmh=150):
+def load_data_and_prepare(engine, participant_id, max_speed_kmh=150, start=None, end=None):
     """
     Charge les points GPS depuis PostgreSQL, calcule les distances, vitesses et
     lisse la vitesse, puis filtre tous les points où la vitesse instantanée
     dépasse max_speed_kmh.
+
+    start / end (Timestamp tz-aware, optionnels) restreignent le chargement à
+    la fenêtre [start, end) pour le traitement par morceaux.
     """
+    query = "SELECT * FROM gps_all_participants WHERE participant_id = :pid"
+    params = {"pid": participant_id}
+    if start is not None:
+        query += ' AND "timestamp" >= :start'
+        params["start"] = pd.Timestamp(start).to_pydatetime()
+    if end is not None:
+        query += ' AND "timestamp" < :end'
+        params["end"] = pd.Timestamp(end).to_pydatetime()
+
     with engine.connect() as conn:
-        df = pd.read_sql_query(
-            text("SELECT * FROM gps_all_participants WHERE participant_id = :pid"),
-            con=conn,
-            params={"pid": participant_id}
-        )
+        df = pd.read_sql_query(text(query), con=conn, params=params)
 
     # 1) Horodatage et fuseau
     df['timestamp'] = (
@@ -54,6 +62,26 @@ def load_data_and_prepare(engine, participant_id, max_speed_kmh=150):
 
     return df
 
+def get_time_range(engine, participant_id):
+    """
+    Premier et dernier horodatage GPS d'un participant (Timestamps Europe/Paris),
+    ou (None, None) s'il n'a aucun point.
+    """
+    with engine.connect() as conn:
+        bounds = pd.read_sql_query(
+            text(
+                'SELECT MIN("timestamp") AS t_min, MAX("timestamp") AS t_max '
+                'FROM gps_all_participants WHERE participant_id = :pid'
+            ),
+            con=conn,
+            params={"pid": participant_id}
+        )
+    if bounds.empty or pd.isna(bounds.loc[0, 't_min']):
+        return None, None
+    t_min = pd.to_datetime(bounds.loc[0, 't_min'], utc=True).tz_convert('Europe/Paris')
+    t_max = pd.to_datetime(bounds.loc[0, 't_max'], utc=True).tz_convert('Europe/Paris')
+    return t_min, t_max
+
 # def segment_by_data_weeks(df):
 #     """
 #     A partir d'un DataFrame contenant au moins la colonne 'timestamp' (datetime),
@@ -1,4 +1,7 @@
 import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
@@ -12,23 +15,88 @@ from classify_home_work           import classify_home_work
 from evaluate_home_work           import evaluate_home_work_classification
 from verify_stop_activities       import verify_stop_activities
 from split_moves_stops            import tag_moves_with_stop_types,snap_moves_to_home_work
-from generate_report              import generate_full_report
+from generate_report              import iter_full_report, REPORT_SECTIONS
+from write_results_to_db          import write_results_to_db
+from chunked_processing           import detect_stops_and_moves_chunked, detect_stops_and_moves_parallel
+from job_manifest                 import JobManifest, shard_of
+from report_assets                import plotly_script_tag, prepare_shared_assets, write_asset_files
+from report_writer                import stream_report, render_report
+from stage_store                  import save_stages, load_stages, stored_pids
 
-def generate_report_for_participant(df: pd.DataFrame, pid: str, engine) -> None:
-    os.makedirs("data", exist_ok=True)
-    path_html = f"data/{pid}_rapport.html"
+# Paramètres de détection MovingPandas (partagés par les modes global et par morceaux)
+DETECTION_PARAMS = dict(
+    min_duration_minutes=5,
+    max_diameter_meters=100,
+    min_move_duration_s=30,
+    min_time_gap_s=900
+)
 
-    # 1+2) Détection brute des stops & moves
-    raw_stops, moves = detect_stops_and_moves(
-        df,
-        min_duration_minutes=5,
-        max_diameter_meters=100,
-        min_move_duration_s=30,
-        min_time_gap_s=900
+def compute_home_work_distances(final_stops: pd.DataFrame) -> pd.DataFrame:
+    """Distances des lieux 'autre' à Home et Work, et indicateur 'suspect' (< 150 m)."""
+    # Vérifier la présence de Home et Work
+    if 'Home' not in final_stops['place_type'].values or 'Work' not in final_stops['place_type'].values:
+        return pd.DataFrame(columns=['lat','lon','dist_home_m','dist_work_m','suspect'])
+
+    # Récupérer coordonnées Home et Work
+    home = final_stops.loc[final_stops['place_type'] == 'Home', ['lat','lon']].iloc[0]
+    work = final_stops.loc[final_stops['place_type'] == 'Work', ['lat','lon']].iloc[0]
+
+    # Filtrer les "autres"
+    autres = final_stops[final_stops['place_type'] == 'autre'].copy()
+
+    # Calculer les distances
+    autres['dist_home_m'] = autres.apply(
+        lambda r: geodesic((r['lat'], r['lon']), (home['lat'], home['lon'])).meters,
+        axis=1
     )
+    autres['dist_work_m'] = autres.apply(
+        lambda r: geodesic((r['lat'], r['lon']), (work['lat'], work['lon'])).meters,
+        axis=1
+    )
+
+    # Définir un indicateur "suspect" si proche de Home ou Work (< 150 m)
+    autres['suspect'] = autres.apply(
+        lambda r: 'Oui' if r['dist_home_m'] < 150 or r['dist_work_m'] < 150 else 'Non',
+        axis=1
+    )
+
+    # Trier par distance à Home
+    return autres[['lat','lon','dist_home_m','dist_work_m','suspect']].sort_values('dist_home_m')
+
+def compute_participant_outputs(
+    df: pd.DataFrame,
+    pid: str,
+    detection: tuple = None,
+    report_options: dict = None,
+    report_path: str = None,
+    point_summary: dict = None
+) -> dict:
+    """
+    Étapes de calcul du pipeline pour un participant (détection, clustering,
+    classification, moves, rapport HTML), sans autre écriture que le rapport.
+
+    detection: (raw_stops, moves) déjà calculés (mode par morceaux) ; sinon la
+    détection est faite ici sur df.
+    report_options: options transmises à iter_full_report (ex. light_map,
+    assets : graphiques et bibliothèques JS en fichiers, voir report_assets,
+    skip_sections : sections du rapport à ne pas produire).
+    report_path: si fourni, le rapport est écrit au fil de l'eau dans ce
+    fichier ('html' vaut alors None) ; sinon il est rendu dans 'html'.
+    point_summary: résumé des points (mode par fenêtres, où df n'est qu'une
+    trace allégée), repris par le rapport et les sorties d'étapes.
+
+    Returns:
+        dict: sorties des étapes ('raw_stops', 'final_stops', 'moves', 'html', ...)
+        ou None si aucun stop n'est détecté.
+    """
+    # 1+2) Détection brute des stops & moves
+    if detection is None:
+        raw_stops, moves = detect_stops_and_moves(df, **DETECTION_PARAMS)
+    else:
+        raw_stops, moves = detection
     if raw_stops.empty:
         print(f"Aucun stop détecté pour {pid}")
-        return
+        return None
 
     # 3) Clustering spatial sur stops bruts
     _, clustered_stops = cluster_stops_dbscan(
@@ -46,47 +114,13 @@ def generate_report_for_participant(df: pd.DataFrame, pid: str, engine) -> None:
     )
     if grouped_stops.empty:
         print(f"Aucun stop agrégé pour {pid}")
-        return
+        return None
 
     # 5) Classification Home/Work/Autre
     final_stops = classify_home_work(grouped_stops)
     evaluation  = evaluate_home_work_classification(final_stops)
 
     # 5bis) Calculer les distances entre Home/Work et les "autres"
-    def compute_home_work_distances(final_stops):
-        from geopy.distance import geodesic
-
-        # Vérifier la présence de Home et Work
-        if 'Home' not in final_stops['place_type'].values or 'Work' not in final_stops['place_type'].values:
-            return pd.DataFrame(columns=['lat','lon','dist_home_m','dist_work_m','suspect'])
-
-        # Récupérer coordonnées Home et Work
-        home = final_stops.loc[final_stops['place_type'] == 'Home', ['lat','lon']].iloc[0]
-        work = final_stops.loc[final_stops['place_type'] == 'Work', ['lat','lon']].iloc[0]
-
-        # Filtrer les "autres"
-        autres = final_stops[final_stops['place_type'] == 'autre'].copy()
-
-        # Calculer les distances
-        autres['dist_home_m'] = autres.apply(
-            lambda r: geodesic((r['lat'], r['lon']), (home['lat'], home['lon'])).meters,
-            axis=1
-        )
-        autres['dist_work_m'] = autres.apply(
-            lambda r: geodesic((r['lat'], r['lon']), (work['lat'], work['lon'])).meters,
-            axis=1
-        )
-
-        # Définir un indicateur "suspect" si proche de Home ou Work (< 150 m)
-        autres['suspect'] = autres.apply(
-            lambda r: 'Oui' if r['dist_home_m'] < 150 or r['dist_work_m'] < 150 else 'Non',
-            axis=1
-        )
-
-        # Trier par distance à Home
-        return autres[['lat','lon','dist_home_m','dist_work_m','suspect']].sort_values('dist_home_m')
-
-    # Appel de la fonction
     autres_with_distances = compute_home_work_distances(final_stops)
 
     # 6) Vérification (facultative)
@@ -119,12 +153,53 @@ def generate_report_for_participant(df: pd.DataFrame, pid: str, engine) -> None:
 
     moves_snapped = snap_moves_to_home_work(moves, final_stops, max_dist_m=150)
 
-    # 8) Sauvegardes CSV
-    raw_stops.to_csv(f"data/{pid}_raw_stops.csv", index=False)
-    moves    .to_csv(f"data/{pid}_moves_filtered.csv", index=False)
+    # 8) Génération du rapport HTML
+    html, asset_files = render_participant_report(
+        df, pid, raw_stops, grouped_stops, final_stops, evaluation,
+        moves, moves_snapped, autres_with_distances,
+        report_options=report_options, report_path=report_path,
+        point_summary=point_summary
+    )
+
+    return {
+        'raw_stops':     raw_stops,
+        'grouped_stops': grouped_stops,
+        'final_stops':   final_stops,
+        'moves':         moves,
+        'moves_snapped': moves_snapped,
+        'html':          html,
+        'report_path':   report_path,
+        'asset_files':   asset_files,
+        'point_summary': point_summary,
+    }
 
-    # 9) Génération du rapport HTML
-    section = generate_full_report(
+def render_participant_report(
+    df: pd.DataFrame,
+    pid: str,
+    raw_stops: pd.DataFrame,
+    grouped_stops: pd.DataFrame,
+    final_stops: pd.DataFrame,
+    evaluation: dict,
+    moves: pd.DataFrame,
+    moves_snapped: pd.DataFrame,
+    autres_with_distances: pd.DataFrame,
+    report_options: dict = None,
+    report_path: str = None,
+    point_summary: dict = None
+) -> tuple:
+    """
+    Rapport HTML d'un participant à partir des sorties d'étapes.
+
+    Returns:
+        (html, asset_files) : html vaut None si le rapport est écrit au fil de
+        l'eau dans report_path ; asset_files ({chemin: octets}) reste à écrire
+        avec write_asset_files.
+    """
+    report_options = dict(report_options or {})
+    assets = report_options.get('assets')
+    asset_files = {}
+    report_options['asset_files'] = asset_files
+    sections = iter_full_report(
         df_all=df,
         stops_summary_all=raw_stops,
         merged_grouped_stops=grouped_stops,
@@ -133,24 +208,324 @@ def generate_report_for_participant(df: pd.DataFrame, pid: str, engine) -> None:
         moves_tagged=moves,
         moves_snapped=moves_snapped,
         pid=pid,
-        autres_with_distances=autres_with_distances
-    )
-    with open(path_html, 'w', encoding='utf-8') as f:
-        f.write(
-            '<!DOCTYPE html><html><head><meta charset="UTF-8">'
-            '<title>Rapport GPS</title>'
-            '<style>body{font-family:Arial; margin:20px;}'
-            'h1,h2,h3{color:#2c3e50;}hr{margin:40px 0;}</style>'
-            '</head><body>'
+        autres_with_distances=autres_with_distances,
+        point_summary=point_summary,
+        **report_options
+    )
+    head_extra = plotly_script_tag(assets) if assets else ''
+    if report_path:
+        stream_report(report_path, sections, pid, head_extra=head_extra)
+        return None, asset_files
+    return render_report(sections, pid, head_extra=head_extra), asset_files
+
+def report_path_for(pid) -> str:
+    """Chemin du rapport HTML d'un participant."""
+    return f"data/{pid}_rapport.html"
+
+def save_participant_outputs(
+    pid: str,
+    outputs: dict,
+    engine,
+    write_db: bool = False,
+    run_id: str = None
+) -> None:
+    """
+    Écritures d'un participant : CSV, sorties d'étapes (si outputs['points'] est
+    fourni, pour la sous-commande report), tables de résultats (optionnel) et
+    rapport HTML.
+    """
+    os.makedirs("data", exist_ok=True)
+    path_html = outputs.get('report_path') or report_path_for(pid)
+
+    # 9) Sauvegardes CSV
+    outputs['raw_stops'].to_csv(f"data/{pid}_raw_stops.csv", index=False)
+    outputs['moves']    .to_csv(f"data/{pid}_moves_filtered.csv", index=False)
+    if outputs.get('points') is not None:
+        save_stages(pid, outputs)
+
+    # 9bis) Écriture des résultats en base (optionnelle)
+    if write_db:
+        written = write_results_to_db(
+            engine, pid, run_id,
+            outputs['raw_stops'], outputs['final_stops'], outputs['moves']
         )
-        f.write(f'<h1>Rapport GPS – Participant {pid}</h1>')
-        f.write(f'<p><em>Date : {pd.Timestamp.now():%Y-%m-%d %H:%M:%S}</em></p>')
-        f.write(section)
-        f.write('</body></html>')
+        print(f"Résultats écrits en base (run {run_id}) : {written}")
+
+    # 10) Rapport HTML (+ graphiques en fichiers en mode assets)
+    write_asset_files(outputs.get('asset_files', {}))
+    if outputs['html'] is not None:
+        with open(path_html, 'w', encoding='utf-8') as f:
+            f.write(outputs['html'])
 
     print(f"=== Rapport généré → {path_html}===")
 
-def main() -> None:
+def generate_report_for_participant(
+    df: pd.DataFrame,
+    pid: str,
+    engine,
+    write_db: bool = False,
+    run_id: str = None,
+    detection: tuple = None,
+    report_options: dict = None,
+    point_summary: dict = None
+) -> None:
+    outputs = compute_participant_outputs(
+        df, pid, detection=detection, report_options=report_options,
+        report_path=report_path_for(pid), point_summary=point_summary
+    )
+    if outputs is None:
+        return
+    outputs['points'] = df
+    save_participant_outputs(pid, outputs, engine, write_db=write_db, run_id=run_id)
+
+def report_options_from_args(args: argparse.Namespace, run_id: str) -> dict:
+    """Options de rendu du rapport issues de la ligne de commande."""
+    figure_jobs = args.figure_jobs
+    parallel = args.use_async if args.command == 'run' else args.workers > 1
+    if figure_jobs is None and parallel:
+        # les processus par participant (--async, report --workers) occupent déjà les cœurs
+        figure_jobs = 1
+    return {
+        'light_map': args.light_map,
+        'figure_jobs': figure_jobs,
+        'assets': f"assets/{run_id}" if args.assets else None,
+        'skip_sections': args.skip_sections,
+    }
+
+def process_participant(engine, pid, args: argparse.Namespace, run_id: str) -> None:
+    """
+    Chargement + traitement complet d'un participant, en une fois ou par
+    fenêtres temporelles (--chunk-hours).
+    """
+    point_summary = None
+    if args.chunk_hours:
+        df, raw_stops, moves, point_summary = detect_stops_and_moves_chunked(
+            engine, pid,
+            window_hours=args.chunk_hours,
+            overlap_minutes=args.chunk_overlap_min,
+            max_speed_kmh=150,
+            **DETECTION_PARAMS
+        )
+        detection = (raw_stops, moves)
+    else:
+        df = load_data_and_prepare(engine, pid, max_speed_kmh=150)
+        detection = None
+        if args.detect_jobs > 1 and not df.empty:
+            detection = detect_stops_and_moves_parallel(
+                df,
+                n_jobs=args.detect_jobs,
+                split_by=args.split_by,
+                overlap_minutes=args.chunk_overlap_min,
+                **DETECTION_PARAMS
+            )
+
+    if df.empty:
+        print("Aucun point GPS.")
+        return
+    generate_report_for_participant(
+        df, pid, engine,
+        write_db=args.write_db, run_id=run_id, detection=detection,
+        report_options=report_options_from_args(args, run_id),
+        point_summary=point_summary
+    )
+
+def regenerate_report(pid, report_options: dict = None) -> str:
+    """
+    Reconstruit data/{pid}_rapport.html à partir des sorties d'étapes
+    enregistrées (voir stage_store), sans base de données ni détection.
+    """
+    stages = load_stages(pid)
+    final_stops = stages['final_stops']
+    path = report_path_for(pid)
+    _, asset_files = render_participant_report(
+        stages['points'], pid,
+        stages['raw_stops'], stages['grouped_stops'], final_stops,
+        evaluate_home_work_classification(final_stops),
+        stages['moves'], stages['moves_snapped'],
+        compute_home_work_distances(final_stops),
+        report_options=report_options, report_path=path,
+        point_summary=stages.get('point_summary')
+    )
+    write_asset_files(asset_files)
+    return path
+
+def run_report_mode(args: argparse.Namespace, run_id: str) -> None:
+    """Sous-commande report : régénère les rapports des participants enregistrés."""
+    pids = args.participants or stored_pids()
+    if not pids:
+        print("Aucune sortie d'étapes enregistrée : lancer d'abord le pipeline (main.py run).")
+        return
+    report_options = report_options_from_args(args, run_id)
+    if args.assets:
+        prepare_shared_assets(report_options['assets'])
+
+    def done(pid, job):
+        try:
+            print(f"=== Rapport régénéré → {job()}===")
+        except Exception as exc:
+            print(f"[ERREUR] {pid} : {exc}")
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [(pid, pool.submit(regenerate_report, pid, report_options)) for pid in pids]
+            for pid, fut in futures:
+                done(pid, fut.result)
+    else:
+        for pid in pids:
+            done(pid, lambda: regenerate_report(pid, report_options))
+
+def run_manifest_worker(engine, manifest: JobManifest, args: argparse.Namespace, run_id: str) -> None:
+    """
+    Boucle d'un nœud en mode manifeste : réclame les participants un par un
+    et enregistre leur statut final (done / failed) dans le manifeste. Le bail
+    du verrou est prolongé en tâche de fond pendant le traitement.
+    """
+    while True:
+        pid = manifest.claim_next(steal=args.steal, retry_failed=args.retry_failed)
+        if pid is None:
+            break
+        print(f"\n=== Participant {pid} (shard {shard_of(pid, args.num_shards)}) ===")
+        try:
+            with manifest.keep_alive(pid):
+                process_participant(engine, pid, args, run_id)
+        except Exception as exc:
+            print(f"[ERREUR] {pid} : {exc}")
+            manifest.mark_failed(pid, exc)
+            continue
+        manifest.mark_done(pid, run_id=run_id)
+
+    print(f"Manifeste {args.manifest} : {manifest.summary()}")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    # Options de rendu du rapport, communes aux sous-commandes run et report
+    report_parser = argparse.ArgumentParser(add_help=False)
+    report_parser.add_argument(
+        '--run-id', default=None,
+        help="Identifiant du run pour --write-db et data/assets/<run_id> (défaut : horodatage de lancement)"
+    )
+    report_parser.add_argument(
+        '--light-map', action='store_true',
+        help="Carte du rapport allégée : calques GeoJSON, tracés simplifiés, marqueurs plafonnés"
+    )
+    report_parser.add_argument(
+        '--figure-jobs', type=int, default=None,
+        help="Processus de rendu des graphiques du rapport (défaut : nombre de cœurs, 1 avec --async)"
+    )
+    report_parser.add_argument(
+        '--assets', action='store_true',
+        help="Graphiques en fichiers SVG/PNG et plotly.js/Leaflet locaux dans data/assets/<run_id>"
+    )
+    report_parser.add_argument(
+        '--skip-sections', type=lambda v: [x for x in v.split(',') if x], default=[],
+        help=f"Sections du rapport à ne pas produire, séparées par des virgules ({','.join(REPORT_SECTIONS)})"
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Segmentation des trajectoires GPS et génération des rapports HTML."
+    )
+    commands = parser.add_subparsers(dest='command')
+    run_parser = commands.add_parser(
+        'run', parents=[report_parser],
+        help="Pipeline complet depuis la base (sous-commande par défaut)"
+    )
+    run_parser.add_argument(
+        '--write-db', action='store_true',
+        help="Écrit stops, lieux classifiés et moves dans les tables de résultats PostgreSQL"
+    )
+    run_parser.add_argument(
+        '--async', dest='use_async', action='store_true',
+        help="Pipeline asynchrone : chargement, calcul et écriture se recouvrent"
+    )
+    run_parser.add_argument(
+        '--workers', type=int, default=2,
+        help="Nombre de processus de calcul en mode --async (défaut : 2)"
+    )
+    run_parser.add_argument(
+        '--prefetch', type=int, default=2,
+        help="Taille des files entre étages en mode --async (défaut : 2)"
+    )
+    run_parser.add_argument(
+        '--manifest', default=None,
+        help="Répertoire partagé du manifeste de cohorte (traitement multi-nœuds)"
+    )
+    run_parser.add_argument(
+        '--shard', type=int, default=0,
+        help="Shard traité en priorité par ce nœud avec --manifest (défaut : 0)"
+    )
+    run_parser.add_argument(
+        '--num-shards', type=int, default=1,
+        help="Nombre total de shards du manifeste (défaut : 1)"
+    )
+    run_parser.add_argument(
+        '--steal', action='store_true',
+        help="Avec --manifest, reprendre aussi les participants en attente des autres shards"
+    )
+    run_parser.add_argument(
+        '--lease-s', type=float, default=4 * 3600,
+        help="Avec --manifest, durée du bail d'un verrou en secondes, prolongée pendant le traitement (défaut : 4 h)"
+    )
+    run_parser.add_argument(
+        '--retry-failed', action='store_true',
+        help="Avec --manifest, retenter les participants en échec"
+    )
+    run_parser.add_argument(
+        '--chunk-hours', type=int, default=None,
+        help="Traitement par fenêtres de N heures (24 = un jour) : mémoire bornée par la fenêtre, rapport sur une trace allégée"
+    )
+    run_parser.add_argument(
+        '--chunk-overlap-min', type=int, default=60,
+        help="Marge de recouvrement entre fenêtres (--chunk-hours) ou morceaux (--detect-jobs), en minutes (défaut : 60)"
+    )
+    run_parser.add_argument(
+        '--detect-jobs', type=int, default=1,
+        help="Détection des stops d'un participant répartie sur N processus (défaut : 1)"
+    )
+    run_parser.add_argument(
+        '--split-by', choices=['gap', 'day'], default='gap',
+        help="Coupure de la trajectoire pour --detect-jobs : longs trous temporels ou jours"
+    )
+
+    regen_parser = commands.add_parser(
+        'report', parents=[report_parser],
+        help="Régénère les rapports depuis les sorties d'étapes enregistrées (ni base, ni détection)"
+    )
+    regen_parser.add_argument(
+        '--participants', type=lambda v: [x for x in v.split(',') if x], default=[],
+        help="Participants à régénérer, séparés par des virgules (défaut : tous ceux enregistrés)"
+    )
+    regen_parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Nombre de processus, un participant par processus (défaut : 1)"
+    )
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in ('run', 'report', '-h', '--help'):
+        # sans sous-commande : pipeline complet (compatibilité)
+        argv = ['run'] + argv
+    args = parser.parse_args(argv)
+    unknown = set(args.skip_sections) - set(REPORT_SECTIONS)
+    if unknown:
+        parser.error(f"--skip-sections : sections inconnues {', '.join(sorted(unknown))}")
+    if args.command == 'report':
+        return args
+    if args.manifest and args.use_async:
+        parser.error("--manifest et --async ne peuvent pas être combinés")
+    if args.chunk_hours and args.use_async:
+        parser.error("--chunk-hours et --async ne peuvent pas être combinés")
+    if args.detect_jobs > 1 and args.use_async:
+        parser.error("--detect-jobs et --async ne peuvent pas être combinés")
+    if args.detect_jobs > 1 and args.chunk_hours:
+        parser.error("--detect-jobs et --chunk-hours ne peuvent pas être combinés")
+    return args
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    run_id = args.run_id or pd.Timestamp.now().strftime('%Y%m%dT%H%M%S')
+
+    if args.command == 'report':
+        run_report_mode(args, run_id)
+        return
+
     load_dotenv()
     url = (
         f"postgresql+psycopg2://{os.getenv('PG_USER')}:{os.getenv('PG_PASSWORD')}"
@@ -164,13 +539,41 @@ def main() -> None:
             conn
         )['participant_id'].tolist()
 
+    manifest = None
+    if args.manifest:
+        manifest = JobManifest(args.manifest, shard=args.shard, num_shards=args.num_shards, lease_s=args.lease_s)
+        manifest.init(pids, run_id=run_id)
+        if manifest.run_id:
+            # run_id commun à toute la cohorte : celui du nœud qui a créé le manifeste
+            if args.run_id and args.run_id != manifest.run_id:
+                raise SystemExit(
+                    f"--run-id {args.run_id} différent du run_id du manifeste {args.manifest} ({manifest.run_id})"
+                )
+            run_id = manifest.run_id
+
+    if args.assets:
+        # bibliothèques JS partagées par tous les rapports du run, préparées une fois
+        prepare_shared_assets(report_options_from_args(args, run_id)['assets'])
+
+    if manifest is not None:
+        run_manifest_worker(engine, manifest, args, run_id)
+        return
+
+    if args.use_async:
+        from async_pipeline import run_async_pipeline
+        run_async_pipeline(
+            engine, pids,
+            workers=args.workers,
+            prefetch=args.prefetch,
+            write_db=args.write_db,
+            run_id=run_id,
+            report_options=report_options_from_args(args, run_id)
+        )
+        return
+
     for pid in pids:
         print(f"\n=== Participant {pid} ===")
-        df = load_data_and_prepare(engine, pid, max_speed_kmh=150)
-        if df.empty:
-            print("Aucun point GPS.")
-            continue
-        generate_report_for_participant(df, pid, engine)
+        process_participant(engine, pid, args, run_id)
 
 if __name__ == '__main__':
     main()
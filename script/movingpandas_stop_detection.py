@@ -58,12 +58,41 @@ def detect_stops_and_moves(
     ]].sort_values('start_time').reset_index(drop=True)
 
     # --- 4) Moves entre stops ---
+    moves_df = build_moves_between_stops(
+        df, raw_stops,
+        min_move_duration_s=min_move_duration_s,
+        min_time_gap_s=min_time_gap_s
+    )
+    return raw_stops, moves_df
+
+def build_moves_between_stops(
+    df: pd.DataFrame,
+    raw_stops: pd.DataFrame,
+    min_move_duration_s: float = 30,
+    min_time_gap_s: float = 900
+) -> pd.DataFrame:
+    """
+    Construit les moves à partir des points GPS situés entre deux stops consécutifs.
+
+    Args:
+        df: points GPS ['timestamp','lat','lon'] (timestamp tz-naive, comme raw_stops)
+        raw_stops: stops triés par start_time
+
+    Returns:
+        moves: DataFrame [start_time,end_time,duration_s,
+                          lat_origin,lon_origin,lat_dest,lon_dest]
+    """
+    # points triés : chaque fenêtre entre deux stops est une tranche contiguë
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values('timestamp', kind='stable')
+    ts = df['timestamp']
+
     moves = []
-    prev_end = df['timestamp'].min()
+    prev_end = ts.min()
     for _, stop in raw_stops.iterrows():
-        window = df[
-            (df['timestamp'] >= prev_end) &
-            (df['timestamp'] <= stop['start_time'])
+        window = df.iloc[
+            ts.searchsorted(prev_end, side='left'):
+            ts.searchsorted(stop['start_time'], side='right')
         ]
         if len(window) >= 2:
             dt  = (window['timestamp'].iloc[-1] - window['timestamp'].iloc[0]).total_seconds()
@@ -81,7 +110,7 @@ def detect_stops_and_moves(
         prev_end = stop['end_time']
 
     # move après le dernier stop
-    window = df[df['timestamp'] >= prev_end]
+    window = df.iloc[ts.searchsorted(prev_end, side='left'):]
     if len(window) >= 2:
         dt = (window['timestamp'].iloc[-1] - window['timestamp'].iloc[0]).total_seconds()
         if dt >= min_move_duration_s:
@@ -95,5 +124,4 @@ def detect_stops_and_moves(
                 'lon_dest':   window['lon'].iloc[-1],
             })
 
-    moves_df = pd.DataFrame(moves)
-    return raw_stops, moves_df
+    return pd.DataFrame(moves)
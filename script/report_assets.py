@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import os
+import re
+import urllib.request
+import uuid
+from io import BytesIO
+
+REPORT_DIR = "data"          # répertoire des rapports HTML (voir save_participant_outputs)
+LIB_DIR = "lib"              # bibliothèques JS/CSS partagées, sous le répertoire d'assets
+PLOTLY_JS = "plotly.min.js"
+
+_CDN_URL = re.compile(r'((?:src|href)=")(https?://[^"]+\.(?:js|css))(")')
+
+
+def encode_figure(fig, fmt: str = 'png'):
+    """
+    Encode une figure matplotlib.
+
+    fmt='png'  : image PNG en base64 (rapport autonome, mode historique)
+    fmt='auto' : (extension, octets) du plus compact entre SVG et PNG, pour
+                 un fichier d'asset
+    """
+    import matplotlib.pyplot as plt
+
+    def save(kind):
+        buf = BytesIO()
+        fig.savefig(buf, format=kind, bbox_inches='tight')
+        return buf.getvalue()
+
+    try:
+        if fmt == 'png':
+            return base64.b64encode(save('png')).decode('utf-8')
+        png, svg = save('png'), save('svg')
+        return ('svg', svg) if len(svg) < len(png) else ('png', png)
+    finally:
+        plt.close(fig)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def local_lib_name(url: str) -> str:
+    """Nom du fichier local d'une bibliothèque CDN (préfixe de hash : pas de collision entre versions)."""
+    return f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}_{url.rsplit('/', 1)[-1]}"
+
+
+def _probe_map_urls() -> list:
+    # Carte témoin avec les mêmes plugins que generate_interactive_map
+    import folium
+    from folium.plugins import HeatMap, MiniMap
+
+    m = folium.Map(location=[48.85, 2.35], tiles='cartodbpositron')
+    m.add_child(MiniMap(toggle_display=True))
+    HeatMap([[48.85, 2.35]]).add_to(m)
+    folium.GeoJson({"type": "FeatureCollection", "features": []}).add_to(m)
+    return [match[1] for match in _CDN_URL.findall(m.get_root().render())]
+
+
+def prepare_shared_assets(assets: str, timeout: float = 20) -> None:
+    """
+    Prépare une fois par run les bibliothèques partagées par tous les rapports,
+    dans REPORT_DIR/{assets}/lib : plotly.js (copie locale fournie par le paquet
+    plotly) et Leaflet et ses plugins (téléchargés depuis leur CDN s'ils ne
+    sont pas déjà présents). Une bibliothèque qui ne peut pas être téléchargée
+    reste chargée depuis le CDN.
+    """
+    lib_dir = os.path.join(REPORT_DIR, assets, LIB_DIR)
+    os.makedirs(lib_dir, exist_ok=True)
+
+    plotly_path = os.path.join(lib_dir, PLOTLY_JS)
+    if not os.path.exists(plotly_path):
+        from plotly.offline import get_plotlyjs
+        _write_atomic(plotly_path, get_plotlyjs().encode('utf-8'))
+
+    for url in _probe_map_urls():
+        path = os.path.join(lib_dir, local_lib_name(url))
+        if os.path.exists(path):
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                _write_atomic(path, resp.read())
+        except OSError as exc:
+            print(f"[WARN] {url} non téléchargé ({exc}) : chargé depuis le CDN")
+
+
+def localize_cdn_urls(html: str, assets: str) -> str:
+    """Remplace les URL CDN du HTML par les copies locales de assets/lib quand elles existent."""
+    lib_dir = os.path.join(REPORT_DIR, assets, LIB_DIR)
+
+    def repl(match):
+        name = local_lib_name(match.group(2))
+        if not os.path.exists(os.path.join(lib_dir, name)):
+            return match.group(0)
+        return f"{match.group(1)}{assets}/{LIB_DIR}/{name}{match.group(3)}"
+
+    return _CDN_URL.sub(repl, html)
+
+
+def plotly_script_tag(assets: str) -> str:
+    """Balise <script> de la copie locale de plotly.js, à placer dans le <head> du rapport."""
+    return f'<script src="{assets}/{LIB_DIR}/{PLOTLY_JS}"></script>'
+
+
+def write_asset_files(files: dict) -> None:
+    """Écrit les fichiers d'assets d'un rapport ({chemin relatif à REPORT_DIR: octets})."""
+    for rel_path, data in files.items():
+        _write_atomic(os.path.join(REPORT_DIR, rel_path), data)
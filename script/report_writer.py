@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+import re
+import uuid
+from string import Template
+
+import pandas as pd
+
+# Pagination côté navigateur des tableaux .paged-table : les lignes de l'aperçu
+# sont paginées ; « Charger toutes les lignes » charge le fichier annexe .js
+# (fonctionne aussi en file://, contrairement à fetch) et pagine les données complètes.
+PAGER_SCRIPT = """<script>
+(function () {
+  function setup(box) {
+    var tbody = box.querySelector('table').tBodies[0];
+    var size = parseInt(box.dataset.pageSize, 10) || 50;
+    var state = {page: 0, rows: Array.prototype.slice.call(tbody.rows), data: null};
+    var nav = document.createElement('div');
+    nav.className = 'pager';
+    box.appendChild(nav);
+
+    function button(label, onclick, disabled) {
+      var b = document.createElement('button');
+      b.textContent = label;
+      b.disabled = disabled;
+      b.onclick = onclick;
+      nav.appendChild(b);
+    }
+    function load() {
+      var s = document.createElement('script');
+      s.src = box.dataset.src;
+      s.onload = function () {
+        state.data = window.reportTableData[box.id];
+        state.page = 0;
+        show();
+      };
+      document.head.appendChild(s);
+    }
+    function show() {
+      var n = state.data ? state.data.length : state.rows.length;
+      var pages = Math.max(1, Math.ceil(n / size));
+      state.page = Math.min(Math.max(state.page, 0), pages - 1);
+      var a = state.page * size, b = Math.min(n, a + size);
+      if (state.data) {
+        tbody.innerHTML = '';
+        for (var i = a; i < b; i++) {
+          var tr = tbody.insertRow();
+          state.data[i].forEach(function (v) { tr.insertCell().textContent = v === null ? '' : v; });
+        }
+      } else {
+        state.rows.forEach(function (tr, i) { tr.style.display = (i >= a && i < b) ? '' : 'none'; });
+      }
+      nav.innerHTML = '';
+      button('\u00ab', function () { state.page--; show(); }, state.page === 0);
+      nav.appendChild(document.createTextNode(' Page ' + (state.page + 1) + ' / ' + pages + ' (' + n + ' lignes) '));
+      button('\u00bb', function () { state.page++; show(); }, state.page >= pages - 1);
+      if (box.dataset.src && !state.data) {
+        button('Charger les ' + box.dataset.total + ' lignes', load, false);
+      }
+    }
+    show();
+  }
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.paged-table').forEach(setup);
+  });
+})();
+</script>"""
+
+# Squelette de page commun à tous les rapports participant
+PAGE_HEAD = Template(
+    '<!DOCTYPE html><html><head><meta charset="UTF-8">'
+    '<title>$title</title>'
+    '<style>body{font-family:Arial; margin:20px;}'
+    'h1,h2,h3{color:#2c3e50;}hr{margin:40px 0;}'
+    '.pager{margin:6px 0 20px;}.pager button{margin:0 4px;}</style>'
+    '$pager_script'
+    '$head_extra'
+    '</head><body>\n'
+    '<h1>$heading</h1>\n'
+    '<p><em>Date : $date</em></p>\n'
+)
+PAGE_FOOT = '</body></html>\n'
+
+TABLE_SECTION = Template('<h3>$title</h3>\n<div class="table-container">\n')
+FIGURE = Template('<h3>$title</h3><img src="$src" width="$width"/><br>\n')
+PAGED_TABLE = Template(
+    '<div class="paged-table" id="$dom_id" data-page-size="$page_size" data-total="$total"$src_attr>\n'
+)
+PREVIEW_NOTE = Template(
+    '<p><em>Aperçu : $shown premières lignes sur $total.$link</em></p>\n'
+)
+
+TABLE_CHUNK_ROWS = 2000
+TABLE_PREVIEW_ROWS = 200     # lignes intégrées au rapport, au-delà : fichiers annexes
+TABLE_PAGE_SIZE = 50         # lignes par page dans le navigateur
+
+
+def html_table_chunks(df: pd.DataFrame, chunk_rows: int = TABLE_CHUNK_ROWS, **to_html_kwargs):
+    """
+    Génère le HTML d'un tableau par blocs de chunk_rows lignes (en-tête une
+    seule fois), pour ne jamais matérialiser le tableau complet en mémoire.
+    """
+    to_html_kwargs.setdefault('index', False)
+    if len(df) <= chunk_rows:
+        yield df.to_html(**to_html_kwargs)
+        return
+
+    header = df.head(0).to_html(**to_html_kwargs)
+    yield header[:header.index('<tbody>') + len('<tbody>')]
+    for start in range(0, len(df), chunk_rows):
+        body = df.iloc[start:start + chunk_rows].to_html(header=False, **to_html_kwargs)
+        yield body[body.index('<tbody>') + len('<tbody>'):body.rindex('</tbody>')]
+    yield '</tbody>\n</table>\n'
+
+
+def _table_sidecars(df: pd.DataFrame, dom_id: str) -> tuple:
+    # CSV compressé (téléchargement) et données JSON enveloppées dans un .js
+    # (chargeable par <script> depuis un rapport ouvert en local)
+    csv_gz = gzip.compress(df.to_csv(index=False).encode('utf-8'))
+    shown = df.copy()
+    for col in shown.columns:
+        if not (pd.api.types.is_numeric_dtype(shown[col]) or pd.api.types.is_bool_dtype(shown[col])):
+            shown[col] = shown[col].astype(str)
+    data = shown.to_json(orient='values', double_precision=6)
+    js = (
+        "window.reportTableData = window.reportTableData || {};\n"
+        f"window.reportTableData[{json.dumps(dom_id)}] = {data};\n"
+    )
+    return csv_gz, js.encode('utf-8')
+
+
+def paged_table_chunks(
+    df: pd.DataFrame,
+    table_id: str,
+    asset_files: dict = None,
+    sidecar_dir: str = None,
+    preview_rows: int = TABLE_PREVIEW_ROWS,
+    page_size: int = TABLE_PAGE_SIZE,
+):
+    """
+    Tableau paginé côté navigateur, de taille plafonnée : seules les
+    preview_rows premières lignes sont intégrées au HTML. Au-delà, les données
+    complètes sont ajoutées à asset_files ({chemin: octets}) sous sidecar_dir :
+    {table_id}.csv.gz (lien de téléchargement) et {table_id}.js (chargé à la
+    demande pour paginer toutes les lignes). Sans asset_files, l'aperçu seul
+    est intégré.
+    """
+    table_id = re.sub(r'[^0-9A-Za-z_-]+', '_', str(table_id))
+    dom_id = f"table-{table_id}"
+    total = len(df)
+    capped = total > preview_rows
+    src_attr, link = '', ''
+    if capped and asset_files is not None and sidecar_dir:
+        csv_path = f"{sidecar_dir}/{table_id}.csv.gz"
+        js_path = f"{sidecar_dir}/{table_id}.js"
+        asset_files[csv_path], asset_files[js_path] = _table_sidecars(df, dom_id)
+        src_attr = f' data-src="{js_path}"'
+        link = f' <a href="{csv_path}">Données complètes (CSV compressé)</a>'
+
+    yield PAGED_TABLE.substitute(dom_id=dom_id, page_size=page_size, total=total, src_attr=src_attr)
+    if capped:
+        yield PREVIEW_NOTE.substitute(shown=preview_rows, total=total, link=link)
+    yield from html_table_chunks(df.head(preview_rows) if capped else df)
+    yield '</div>\n'
+
+
+def _iter_page(sections, pid, head_extra=''):
+    yield PAGE_HEAD.substitute(
+        title='Rapport GPS',
+        pager_script=PAGER_SCRIPT,
+        head_extra=head_extra,
+        heading=f'Rapport GPS – Participant {pid}',
+        date=f'{pd.Timestamp.now():%Y-%m-%d %H:%M:%S}',
+    )
+    yield from sections
+    yield PAGE_FOOT
+
+
+def stream_report(path: str, sections, pid, head_extra: str = '') -> str:
+    """
+    Écrit le rapport au fil de l'eau : chaque morceau de HTML produit par
+    sections (itérable de chaînes, typiquement un générateur de sections) est
+    écrit dès qu'il est prêt. Le fichier est écrit sous un nom temporaire puis
+    renommé : un rapport interrompu ne remplace pas le précédent.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for chunk in _iter_page(sections, pid, head_extra):
+                f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def render_report(sections, pid, head_extra: str = '') -> str:
+    """Même page que stream_report, en une seule chaîne."""
+    return ''.join(_iter_page(sections, pid, head_extra))
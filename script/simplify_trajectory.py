@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Tolérance par usage : mètres pour la géométrie, secondes pour le temps
+TOLERANCES = {
+    'map_path':      10,    # Douglas-Peucker du trajet complet (m)
+    'map_day':       5,     # Douglas-Peucker des trajets journaliers (m)
+    'map_markers':   15,    # espacement minimal des marqueurs de points (m)
+    'heatmap':       30,    # un point de heatmap par tranche (s) : densité pondérée par le temps
+    'speed_plot':    60,    # pas des séries de vitesse (s)
+    'chunk_trace':   30,    # trace du rapport en mode par fenêtres : un point par tranche (s)
+}
+
+
+def to_local_xy(lat, lon):
+    """
+    Projette lat/lon (degrés) en mètres sur un plan tangent équirectangulaire
+    centré sur le barycentre des points : suffisant à l'échelle d'une ville.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if lat.size == 0:
+        return lat, lon
+    lat0 = np.radians(np.nanmean(lat))
+    lon0 = np.nanmean(lon)
+    x = EARTH_RADIUS_M * np.radians(lon - lon0) * np.cos(lat0)
+    y = EARTH_RADIUS_M * np.radians(lat - np.degrees(lat0))
+    return x, y
+
+
+def douglas_peucker_mask(x, y, tolerance):
+    """
+    Masque des points conservés par Douglas-Peucker (tolérance dans l'unité de x/y).
+    Les distances au segment sont calculées en bloc avec NumPy pour chaque
+    sous-segment ; seuls les découpages sont itératifs.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        xs, ys = x[i + 1:j], y[i + 1:j]
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        norm2 = dx * dx + dy * dy
+        if norm2 == 0:
+            dist = np.hypot(xs - x[i], ys - y[i])
+        else:
+            # distance au segment (et non à la droite) : un aller-retour dans
+            # l'axe du segment reste un écart
+            t = np.clip(((xs - x[i]) * dx + (ys - y[i]) * dy) / norm2, 0, 1)
+            dist = np.hypot(xs - (x[i] + t * dx), ys - (y[i] + t * dy))
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            mid = i + 1 + k
+            keep[mid] = True
+            stack.append((i, mid))
+            stack.append((mid, j))
+    return keep
+
+
+def simplify_latlon(lat, lon, tolerance_m):
+    """Masque Douglas-Peucker d'une trajectoire lat/lon avec une tolérance en mètres."""
+    x, y = to_local_xy(lat, lon)
+    return douglas_peucker_mask(x, y, tolerance_m)
+
+
+def distance_thin_mask(lat, lon, min_dist_m):
+    """
+    Amincissement par distance : un point est gardé chaque fois que la distance
+    cumulée le long du trajet franchit un nouveau multiple de min_dist_m
+    (premier et dernier point toujours gardés). Les points immobiles, très
+    nombreux pendant les stops, disparaissent ainsi en grande partie.
+    """
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n <= 2 or min_dist_m <= 0:
+        return keep
+    x, y = to_local_xy(lat, lon)
+    cumdist = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))])
+    bucket = np.floor(cumdist / min_dist_m)
+    keep[1:] = bucket[1:] != bucket[:-1]
+    keep[-1] = True
+    return keep
+
+
+def time_bucket_mask(timestamps, bucket_s):
+    """Masque du premier point de chaque tranche de bucket_s secondes (timestamps triés)."""
+    # asi8 en nanosecondes quelle que soit la résolution d'entrée (datetime64[us], [ms]...)
+    ts = pd.DatetimeIndex(timestamps).as_unit('ns')
+    n = len(ts)
+    keep = np.ones(n, dtype=bool)
+    if n <= 1:
+        return keep
+    buckets = ts.asi8 // int(bucket_s * 1e9)
+    keep[1:] = buckets[1:] != buckets[:-1]
+    return keep
+
+
+def time_bucket_mean(timestamps, values, bucket_s, name=None):
+    """
+    Moyenne de values par tranches régulières de bucket_s secondes, sur une
+    grille continue (NaN pour les tranches vides), comme Series.resample().mean().
+    Les tranches sont alignées en UTC : pour un pas divisant l'heure, elles
+    coïncident avec celles de l'heure de Paris, y compris aux changements d'heure.
+    """
+    ts = pd.DatetimeIndex(timestamps).as_unit('ns')
+    values = np.asarray(values, dtype=float)
+    if len(ts) == 0:
+        return pd.Series(dtype=float, index=ts, name=name)
+
+    step = int(bucket_s * 1e9)
+    buckets = ts.asi8 // step
+    first = buckets.min()
+    pos = buckets - first
+    valid = ~np.isnan(values)
+    sums = np.bincount(pos[valid], weights=values[valid], minlength=pos.max() + 1)
+    counts = np.bincount(pos[valid], minlength=pos.max() + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    grid = pd.to_datetime((first + np.arange(len(means))) * step)
+    if ts.tz is not None:
+        grid = grid.tz_localize('UTC').tz_convert(ts.tz)
+    return pd.Series(means, index=grid.rename(ts.name), name=name)
+
+
+def evenly_spaced_indices(n, max_points):
+    """Au plus max_points positions parmi n, régulièrement espacées (extrémités incluses)."""
+    if n <= max_points:
+        return np.arange(n)
+    return np.linspace(0, n - 1, max_points).round().astype(int)
+
+
+def cap_mask(mask, max_points):
+    """Réduit un masque à au plus max_points points, régulièrement espacés."""
+    idx = np.flatnonzero(mask)
+    if len(idx) <= max_points:
+        return mask
+    capped = np.zeros_like(mask)
+    capped[idx[evenly_spaced_indices(len(idx), max_points)]] = True
+    return capped
@@ -0,0 +1,65 @@
+import os
+import uuid
+
+import pandas as pd
+
+STAGE_DIR = "data/stages"
+
+# Sorties d'étapes conservées pour régénérer le rapport sans base ni détection
+STAGES = (
+    'points',          # points GPS prétraités (load_data_and_prepare)
+    'raw_stops',       # stops bruts
+    'grouped_stops',   # stops regroupés (clustering + regroupement spatio-temporel)
+    'final_stops',     # lieux classifiés Home/Work/autre
+    'moves',           # moves étiquetés et filtrés
+    'moves_snapped',   # moves recalés sur Home/Work
+)
+
+# Sorties enregistrées seulement quand elles existent
+OPTIONAL_STAGES = (
+    'point_summary',   # résumé des points quand 'points' est une trace allégée (--chunk-hours)
+)
+
+
+def stage_dir(pid) -> str:
+    return os.path.join(STAGE_DIR, str(pid))
+
+
+def save_stages(pid, outputs: dict) -> None:
+    """
+    Enregistre les sorties d'étapes d'un participant (pickle pandas : types,
+    fuseaux horaires et listes merged_starts conservés tels quels), une par
+    fichier, écrit sous un nom temporaire puis renommé.
+    """
+    root = stage_dir(pid)
+    os.makedirs(root, exist_ok=True)
+    for name in STAGES + OPTIONAL_STAGES:
+        path = os.path.join(root, f"{name}.pkl")
+        if name in OPTIONAL_STAGES and outputs.get(name) is None:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        pd.to_pickle(outputs[name], tmp)
+        os.replace(tmp, path)
+
+
+def load_stages(pid) -> dict:
+    """Relit les sorties d'étapes d'un participant ({nom: DataFrame}, sorties optionnelles si présentes)."""
+    root = stage_dir(pid)
+    stages = {name: pd.read_pickle(os.path.join(root, f"{name}.pkl")) for name in STAGES}
+    for name in OPTIONAL_STAGES:
+        path = os.path.join(root, f"{name}.pkl")
+        if os.path.exists(path):
+            stages[name] = pd.read_pickle(path)
+    return stages
+
+
+def stored_pids() -> list:
+    """Participants dont toutes les sorties d'étapes sont enregistrées."""
+    if not os.path.isdir(STAGE_DIR):
+        return []
+    return sorted(
+        pid for pid in os.listdir(STAGE_DIR)
+        if all(os.path.exists(os.path.join(STAGE_DIR, pid, f"{name}.pkl")) for name in STAGES)
+    )
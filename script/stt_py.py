@@ -6,12 +6,17 @@ based on "My home is my secret: concealing sensitive locations by context-aware
 """
 
 import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
 import fiona
-from datetime import datetime
 import os
+from glob import glob
 import pandas as pd
 from shapely.geometry import LineString, shape, Point, Polygon
 from shapely.ops import transform
+from shapely.strtree import STRtree
 import pyproj
 from rtree import index
 import skmob as sm
@@ -22,9 +27,38 @@ import geopandas as gpd
 _INPUTPATH = os.path.join(os.path.dirname(__file__), "stt_input/")
 _INDEXPATH = os.path.join(os.path.dirname(__file__), "stt_index/")
 
+# values of the clustering parameter k for which cells and indices are available
+_K_VALUES = [3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30]
+
+# number of candidate points whose truncation conditions are evaluated at once
+_TRUNCATION_BLOCK = 64
+
+# Geolife points outside of the area covered by EPSG:2345 are filtered out: (lon_min, lon_max, lat_min, lat_max)
+_GEOLIFE_AREA = (114.0, 120.0, 22.14, 51.52)
+_EARTH_RADIUS_KM = 6371.0
+# number of points compared at once to an anchor point by the speed filter
+_FILTER_BLOCK = 256
+
+# STT object inherited by the worker processes of STT.truncate (fork), see _init_truncation_worker
+_WORKER_STT = None
+
+@lru_cache(maxsize=None)
+def _get_transformer(old, new):
+    # building a transformer is costly: one per (old, new) pair and process
+    return pyproj.Transformer.from_crs(pyproj.CRS(old), pyproj.CRS(new), always_xy=True)
+
+
 def _crs_transform(shp, old, new):
-    project = pyproj.Transformer.from_crs(pyproj.CRS(old), pyproj.CRS(new), always_xy=True).transform
-    return transform(project, shp)
+    return transform(_get_transformer(old, new).transform, shp)
+
+
+def _project_xy(x, y, old, new):
+    """
+    Projects coordinate arrays from CRS old to CRS new in one call
+    :return: tuple of numpy arrays (x, y)
+    """
+    px, py = _get_transformer(old, new).transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return np.asarray(px), np.asarray(py)
 
 
 def _get_direction_between(p1, p2):
@@ -33,6 +67,13 @@ def _get_direction_between(p1, p2):
     return math.degrees(arctangent)
 
 
+def _directions_between(dx, dy):
+    # vectorized _get_direction_between, for coordinate differences p1 - p2
+    arctangent = np.arctan2(dy, dx)
+    arctangent = np.where(arctangent < 0, arctangent + 2 * math.pi, arctangent)
+    return np.degrees(arctangent)
+
+
 def _get_endpoints(trajectory):
     return trajectory.iloc[[0, -1], 0:3].to_numpy()
 
@@ -49,7 +90,8 @@ class STT:
     def __init__(self, pcells_crs, trajectory_crs,
                  alpha=60, k=4, buffer=0,
                  sensitive_locations=[],
-                 add_endpoints=True, add_stops=False, truncation_region=None):
+                 add_endpoints=True, add_stops=False, truncation_region=None, in_memory_index=False,
+                 protection_sites=None):
         """
         Initialize the S-TT object.
 
@@ -68,6 +110,11 @@ class STT:
             locations
         :param truncation_region: Polygon of the region where truncation is executed. Sensitive locations outside of
             this region are ignored. Usually the extent of the set of sites.
+        :param in_memory_index: If true, the protection cell index is bulk-loaded in memory from cells_{k}.shp
+            instead of being opened from the disk index built by build_rtrees.
+        :param protection_sites: Optional tuple (cells, sites) replacing the stt_input/ files and the index: cells maps
+            protection cell ids to polygons in pcells_crs, sites maps the same ids to (n, 2) arrays of the
+            coordinates of the cell's sites. Every cell must hold at least k sites (ValueError otherwise).
         """
 
         self.sensitive_locations = sensitive_locations  # point array
@@ -81,16 +128,45 @@ class STT:
         self.add_endpoints = add_endpoints
         self.pcells_crs = pcells_crs
         self.trajectory_crs = trajectory_crs
-        self.multipoints = self._load_multipoints()
-        self.pcell_idx = index.Index(_INDEXPATH + str(self.k))
+        if protection_sites is not None:
+            cells, sites = protection_sites
+            self.multipoints = {str(i): np.asarray(c, dtype=float).reshape(-1, 2) for i, c in sites.items()}
+            # a cell with fewer than k sites does not hide which site is visited
+            small = [i for i in cells if len(self.multipoints.get(str(i), ())) < self.k]
+            if small:
+                raise ValueError(f"{len(small)} protection cells hold fewer than k={self.k} sites, e.g. cell {small[0]}")
+            self.pcell_idx_path = None
+            self.pcell_idx = _rtree_from_items((int(i), geom.bounds, geom) for i, geom in cells.items())
+        elif in_memory_index:
+            self.multipoints = self._load_multipoints()
+            self.pcell_idx_path = None
+            self.pcell_idx = build_rtree(self.k, in_memory=True)
+        else:
+            self.multipoints = self._load_multipoints()
+            self.pcell_idx_path = _INDEXPATH + str(self.k)
+            self.pcell_idx = index.Index(self.pcell_idx_path)
+        self.pcell_ids, self.pcell_tree = self._load_pcell_tree()
         self.truncation_region = truncation_region
 
+    def _load_pcell_tree(self):
+        # in-memory STRtree of all protection cells of the index, for bulk point lookups
+        items = list(self.pcell_idx.intersection(self.pcell_idx.bounds, objects=True)) if len(self.pcell_idx) else []
+        ids = np.array([pc.id for pc in items], dtype=np.int64)
+        return ids, STRtree([pc.object for pc in items])
+
     def _load_multipoints(self):
+        # site coordinates of each protection cell, as an (n_sites, 2) array
         multipoints = {}
         for feat in fiona.open(_INPUTPATH + "multipoints_" + str(self.k) + ".shp"):
-            multipoints[feat['properties']['myid']] = feat['geometry']
+            coords = np.atleast_2d(np.asarray(feat['geometry']['coordinates'], dtype=float))[:, :2]
+            multipoints[feat['properties']['myid']] = coords
         return multipoints
 
+    def _wedge_sites(self, pcells):
+        # coordinates of the sites of all protection cells in pcells
+        sites = [self.multipoints[str(pcell)] for pcell in pcells]
+        return np.concatenate(sites) if sites else np.empty((0, 2))
+
     def _get_pcells_containing_shape(self, shp):
         pcells = {}  # list that will be filled with protection cells
 
@@ -104,73 +180,86 @@ class STT:
 
         return pcells
 
+    def _get_pcell_ids(self, geoms):
+        """
+        Protection cell id of each point of geoms in one STRtree query (-1 outside of all cells). Points lying on
+        the boundary of several cells keep the first cell returned by _get_pcells_containing_shape.
+        """
+        cells = np.full(len(geoms), -1, dtype=np.int64)
+        point_idx, tree_idx = self.pcell_tree.query(geoms, predicate='intersects')
+        n_hits = np.bincount(point_idx, minlength=len(geoms))
+        single = n_hits[point_idx] == 1
+        cells[point_idx[single]] = self.pcell_ids[tree_idx[single]]
+        for i in np.flatnonzero(n_hits > 1):
+            cells[i] = next(iter(self._get_pcells_containing_shape(geoms[i])))
+        return cells
+
     def _evaluate_direction(self, curr_point, prev_point, pcells):
-        no_point = True
-        all_points = True
+        return bool(self._direction_mask(
+            np.array([[curr_point.x, curr_point.y]]), np.array([[prev_point.x, prev_point.y]]), pcells
+        )[0])
+
+    def _proximity_mask(self, cells, s_pcells):
+        # proximity condition for each point, from its precomputed protection cell id
+        return np.isin(cells, list(s_pcells))
 
-        d_trajectory = _get_direction_between(curr_point, prev_point)
+    def _direction_mask(self, curr_xy, prev_xy, pcells):
+        """
+        Direction condition for a batch of trajectory points (curr_xy, with their previous points prev_xy,
+        both (n, 2) arrays): True where the sites of pcells are either all or none inside the wedge of opening
+        angle alpha around the trajectory direction (do not truncate), False otherwise (truncate).
+        """
+        sites = self._wedge_sites(pcells)
+        d_trajectory = _directions_between(curr_xy[:, 0] - prev_xy[:, 0], curr_xy[:, 1] - prev_xy[:, 1])
+        d_p = _directions_between(sites[None, :, 0] - curr_xy[:, None, 0], sites[None, :, 1] - curr_xy[:, None, 1])
+        d_diff = np.abs(d_p - d_trajectory[:, None])
         max_diff = self.alpha/2
+        in_wedge = (d_diff <= max_diff) | (360 - d_diff <= max_diff)
+        return in_wedge.all(axis=1) | ~in_wedge.any(axis=1)
 
-        for pcell in pcells:
-            multipoints = self.multipoints[str(pcell)]
-            for p_coords in multipoints['coordinates']:
-                p = Point(p_coords)
-                d_p = _get_direction_between(p, curr_point)
-                d_diff = abs(d_p - d_trajectory)
-                if d_diff <= max_diff or 360 - d_diff <= max_diff:
-                    no_point = False
-                else:
-                    all_points = False
-                if not no_point and not all_points:
-                    return False  # condition not fulfilled, truncate
-        return True  # do not truncate, either all or none of the points are in the wedge
-
-    def _execute_truncation(self, points, pcells, reverse=False):
-        # points is a dataframe, lng and lat contain the original coordinates,
-        # geometry a transformed Shapely point
+    def _execute_truncation(self, points, start, stop, pcells, reverse=False):
+        # points is a tuple (times, cells, xy) of arrays over the whole trajectory: timestamps, protection cell ids
+        # and transformed coordinates; the sub-trajectory to truncate is points[start:stop]
         # paramter pcells is a dictionary where the key is the timestamp of the sensitive location in the trajectory
+        # returns the (start, stop) offsets of the truncated sub-trajectory, empty if truncated completely
+        times, cells, xy = points
+        if stop <= start:
+            return start, start
 
         # get the protection cell for the end to be truncated
+        s_pcells = pcells[times[start]] if reverse else pcells[times[stop-1]]
+
+        # candidate points in truncation order, moving away from the sensitive location.
+        # The last point reached is never kept: the trajectory is then truncated completely.
         if reverse:
-            s_pcells = pcells[points.iloc[0, 2]]
+            candidates = np.arange(start, stop-1)
+            previous = candidates + 1
         else:
-            s_pcells = pcells[points.iloc[len(points)-1, 2]]
-        for i in range(len(points)):
-            if reverse:
-                if i >= len(points)-1:
-                    return pd.DataFrame(columns=points.columns)  # complete truncation
-                curr = points.iloc[i, :]
-                prev_id = i+1
-            else:
-                if len(points)-i-1 == 0:
-                    return pd.DataFrame(columns=points.columns)  # complete truncation
-                curr = points.iloc[len(points)-i-1, :]
-                prev_id = len(points)-i-2
+            candidates = np.arange(stop-1, start, -1)
+            previous = candidates - 1
 
-            curr_point = curr['geometry']
+        # conditions are evaluated block by block, stopping at the first block
+        # containing a point that fulfills neither of them
+        for offset in range(0, len(candidates), _TRUNCATION_BLOCK):
+            block = candidates[offset:offset + _TRUNCATION_BLOCK]
+            prev_block = previous[offset:offset + _TRUNCATION_BLOCK]
 
-            curr_cell = list(self._get_pcells_containing_shape(curr_point))
-            if len(curr_cell) > 0 and curr_cell[0] in s_pcells:  # proximity condition
-                continue  # truncated
+            truncated = self._proximity_mask(cells[block], s_pcells)
+            # the direction condition is not evaluated for the sensitive location itself
+            check = ~truncated & (block != start) if reverse else ~truncated
+            if check.any():
+                truncated[check] = ~self._direction_mask(xy[block[check]], xy[prev_block[check]], s_pcells)
 
-            if (not reverse and i != len(points)-1) or (reverse and i != 0):
-                # direction condition
-                prev_point = points.iloc[prev_id]['geometry']
-                if not self._evaluate_direction(curr_point, prev_point, s_pcells):
-                    continue  # truncated
+            kept = np.flatnonzero(~truncated)
+            if len(kept) > 0:
+                # truncation has stopped, return the truncated sub-trajectory
+                j = block[kept[0]]
+                return (j, stop) if reverse else (start, j+1)
 
-            # if this point is reached, truncation has stopped.
-            # return the truncated trajectory
-            return points.iloc[i:, :] if reverse else points.iloc[:len(points)-i, :]
-
-        return gpd.GeoDataFrame(columns=points.columns)
+        return start, start  # complete truncation
 
     def _transform_shape(self, shp):
-        from_crs = pyproj.CRS(self.trajectory_crs)
-        to_crs = pyproj.CRS(self.pcells_crs)
-        project = pyproj.Transformer.from_crs(from_crs, to_crs, always_xy=True).transform
-        transformed = transform(project, shp)
-        return transformed
+        return _crs_transform(shp, self.trajectory_crs, self.pcells_crs)
 
     def _add_pcell(self, pcells, p, ts):
         if self.buffer > 0:
@@ -182,98 +271,276 @@ class STT:
         return pcells
 
     def _split_trajectory(self, sensitive_locations, trajectory_gdf):
+        """
+        Split the trajectory at the stay points of sensitive_locations (sorted by time) in one pass, locating their
+        start and end timestamps by binary search in the sorted datetime column.
+
+        :return: pcells, a dictionary of the protection cells of each sensitive location keyed by timestamp, and
+            the sub-trajectories as a list of (start, stop) position offsets into trajectory_gdf
+        """
         pcells = {}
         sub_trajectories = []
-
+        times = pd.DatetimeIndex(trajectory_gdf['datetime'])
+        sorted_times = times.is_monotonic_increasing
+        geometry = trajectory_gdf.geometry.values
+
+        def locate(ts, cut):
+            # position of the first point at ts from position cut on
+            if sorted_times:
+                j = cut + times[cut:].searchsorted(ts, side='left')
+                found = j < len(times) and times[j] == ts
+            else:  # unsorted trajectory: linear scan
+                matches = np.flatnonzero(times[cut:] == ts)
+                j = cut + matches[0] if len(matches) > 0 else len(times)
+                found = len(matches) > 0
+            if not found:
+                raise ValueError(f"sensitive location timestamp {ts} is not a point of the trajectory")
+            return j
+
+        # projected coordinates of all sensitive locations, in one call (used for endpoints)
+        s_x, s_y = _project_xy([s[0] for s in sensitive_locations], [s[1] for s in sensitive_locations],
+                               self.trajectory_crs, self.pcells_crs)
+
+        cut = 0  # start of the remaining trajectory
         for i in range(len(sensitive_locations)):
             s = sensitive_locations[i]
             if len(s) > 3:  # a staypoint
-                j_start = trajectory_gdf.loc[trajectory_gdf['datetime'] == s[2]].index[0]
-                j_end = trajectory_gdf.loc[trajectory_gdf['datetime'] == s[3]].index[0]
-                pcells = self._add_pcell(pcells=pcells, ts=s[2], p=trajectory_gdf.loc[j_start, 'geometry'])
-                pcells = self._add_pcell(pcells=pcells, ts=s[3], p=trajectory_gdf.loc[j_end, 'geometry'])
-                sub_trajectories.append(trajectory_gdf.loc[:j_start, :])
-                trajectory_gdf = trajectory_gdf.loc[j_end:, :]
+                j_start = locate(s[2], cut)
+                j_end = locate(s[3], cut)
+                pcells = self._add_pcell(pcells=pcells, ts=s[2], p=geometry[j_start])
+                pcells = self._add_pcell(pcells=pcells, ts=s[3], p=geometry[j_end])
+                sub_trajectories.append((cut, j_start + 1))
+                cut = j_end
             else:  # an endpoint
-                s_transformed = self._transform_shape(Point(s[0], s[1]))
-                pcells = self._add_pcell(pcells=pcells, ts=s[2], p=s_transformed)
+                pcells = self._add_pcell(pcells=pcells, ts=s[2], p=Point(s_x[i], s_y[i]))
 
-        sub_trajectories.append(trajectory_gdf)
-        sub_trajectories = [x for x in sub_trajectories if len(x) > 1]
+        sub_trajectories.append((cut, len(times)))
+        sub_trajectories = [(start, stop) for start, stop in sub_trajectories if stop - start > 1]
         return pcells, sub_trajectories
 
-    def _truncate_and_reassemble(self, trajectory_gdf, sub_trajectories, sensitive_locations, pcells):
-        truncated_trajectory = gpd.GeoDataFrame(columns=trajectory_gdf.columns)
+    def _truncate_and_reassemble(self, trajectory_gdf, sub_trajectories, sensitive_locations, pcells, cells):
+        # sub-trajectories are truncated on position offsets, the rows kept are taken once at the end
+        times = trajectory_gdf['datetime'].to_numpy(dtype=object)
+        xy = np.column_stack([trajectory_gdf.geometry.x.to_numpy(), trajectory_gdf.geometry.y.to_numpy()])
+        points = (times, cells, xy)
+
+        pieces = []
         for i in range(len(sub_trajectories)):
-            t = sub_trajectories[i]
-            if len(sensitive_locations) > 0 and (i > 0 or t.iloc[0, 2] == sensitive_locations[0][2]):
-                trunc_result_1 = self._execute_truncation(t, pcells, reverse=True)
+            start, stop = sub_trajectories[i]
+            if len(sensitive_locations) > 0 and (i > 0 or times[start] == sensitive_locations[0][2]):
+                start_1, stop_1 = self._execute_truncation(points, start, stop, pcells, reverse=True)
             else:
-                trunc_result_1 = t
-            if len(trunc_result_1) == 0:  # if t already was truncated completely
+                start_1, stop_1 = start, stop
+            if stop_1 <= start_1:  # if t already was truncated completely
                 continue
             elif len(sensitive_locations) > 0 and \
-                    (i < len(sub_trajectories) - 1 or t.iloc[-1, 2] == sensitive_locations[-1][2]):
-                trunc_result_2 = self._execute_truncation(trunc_result_1, pcells)
+                    (i < len(sub_trajectories) - 1 or times[stop-1] == sensitive_locations[-1][2]):
+                start_2, stop_2 = self._execute_truncation(points, start_1, stop_1, pcells)
             else:
-                trunc_result_2 = trunc_result_1
+                start_2, stop_2 = start_1, stop_1
 
-            truncated_trajectory = truncated_trajectory.append(trunc_result_2)
+            if stop_2 > start_2:
+                pieces.append(np.arange(start_2, stop_2))
 
-        return truncated_trajectory
+        if not pieces:
+            return gpd.GeoDataFrame(columns=trajectory_gdf.columns)
+        return trajectory_gdf.iloc[np.concatenate(pieces)].copy()
 
-    def truncate(self, trajectories):
+    def truncate(self, trajectories, n_jobs=1):
         """
         Execute S-TT for a set of trajectories
 
         :param trajectories: list of trajectories where each trajectory is a skmob.TrajDataFrame
-        :return: list of truncated trajectories
+        :param n_jobs: number of worker processes truncating trajectories concurrently (None: all cores). Workers
+            are forked and inherit the loaded protection cells and multipoints; on platforms without fork, or with
+            n_jobs=1, trajectories are truncated in the current process.
+        :return: list of truncated trajectories, in the order of trajectories
         """
-        output = []
+        global _WORKER_STT
+
+        n_jobs = n_jobs or os.cpu_count() or 1
+        n_jobs = min(n_jobs, len(trajectories))
+        if n_jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return [self._truncate_trajectory(trajectory) for trajectory in trajectories]
+
+        _WORKER_STT = self
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_truncation_worker) as pool:
+                return list(pool.map(_truncate_in_worker, trajectories))
+        finally:
+            _WORKER_STT = None
+
+    def _truncate_trajectory(self, trajectory):
+        x, y = _project_xy(trajectory.lng, trajectory.lat, self.trajectory_crs, self.pcells_crs)
+        trajectory_gdf = gpd.GeoDataFrame(trajectory, geometry=gpd.points_from_xy(x, y, crs=self.pcells_crs))
+        # protection cells of all points, looked up once before truncation
+        cells = self._get_pcell_ids(trajectory_gdf.geometry.values)
+
+        sloc_candidates = self.sensitive_locations.copy()
+
+        if self.add_stops:
+            sloc_candidates.extend(_get_stops(trajectory))
+        if self.add_endpoints:
+            sloc_candidates.extend(_get_endpoints(trajectory))
+
+        if self.truncation_region:
+            sensitive_locations = [r for r in sloc_candidates if Point(r[0], r[1]).intersects(self.truncation_region)]
+        else:
+            sensitive_locations = sloc_candidates
+
+        sensitive_locations.sort(key=lambda x: x[2])
 
-        for trajectory in trajectories:
-            trajectory_gdf = gpd.GeoDataFrame(trajectory, geometry=gpd.points_from_xy(trajectory.lng, trajectory.lat))
-            trajectory_gdf = trajectory_gdf.set_crs(self.trajectory_crs).to_crs(self.pcells_crs)
+        # split trajectory at sensitive locations
+        # and get all the pcells
+        pcells, sub_trajectories = self._split_trajectory(sensitive_locations, trajectory_gdf)
 
-            sloc_candidates = self.sensitive_locations.copy()
+        # truncate the sub-trajectories
+        truncated_trajectory = self._truncate_and_reassemble(trajectory_gdf, sub_trajectories, sensitive_locations, pcells,
+                                                             cells)
+        truncated_trajectory['datetime'] = truncated_trajectory['datetime'].apply(str)
+        return truncated_trajectory
 
-            if self.add_stops:
-                sloc_candidates.extend(_get_stops(trajectory))
-            if self.add_endpoints:
-                sloc_candidates.extend(_get_endpoints(trajectory))
 
-            if self.truncation_region:
-                sensitive_locations = [r for r in sloc_candidates if Point(r[0], r[1]).intersects(self.truncation_region)]
-            else:
-                sensitive_locations = sloc_candidates
+def _init_truncation_worker():
+    # the forked worker shares the rtree file descriptors of its parent: reopen the disk index
+    if _WORKER_STT.pcell_idx_path is not None:
+        _WORKER_STT.pcell_idx = index.Index(_WORKER_STT.pcell_idx_path)
 
-            sensitive_locations.sort(key=lambda x: x[2])
 
-            # split trajectory at sensitive locations
-            # and get all the pcells
-            pcells, sub_trajectories = self._split_trajectory(sensitive_locations, trajectory_gdf)
+def _truncate_in_worker(trajectory):
+    return _WORKER_STT._truncate_trajectory(trajectory)
 
-            # truncate the sub-trajectories
-            truncated_trajectory = self._truncate_and_reassemble(trajectory_gdf, sub_trajectories, sensitive_locations, pcells)
-            truncated_trajectory['datetime'] = truncated_trajectory['datetime'].apply(str)
-            output.append(truncated_trajectory)
 
-        return output
+def _cell_items(k):
+    # protection cells of cells_{k}.shp as rtree stream items (id, bounds, object)
+    with fiona.open(_INPUTPATH + "cells_" + str(k) + ".shp") as cells:
+        for feat in cells:
+            geom = shape(feat['geometry'])
+            yield int(feat['properties']['myid']), geom.bounds, geom
 
 
-def build_rtrees():
+def build_rtree(k, in_memory=False):
     """
-    Builds index structures of the site cluster cells. Requires setting the _INDEXPATH variable to the directory
-    where the indices are stored
+    Builds the index structure of the site cluster cells for one value of k, bulk-loaded (STR packing) from a
+    stream of the cells
+
+    :param k: clustering parameter k
+    :param in_memory: if true, the index is built in memory and not written to _INDEXPATH
+    :return: rtree.index.Index
     """
-    for k in [3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30]:
-        idx = index.Index(_INDEXPATH + str(k))  # build spatial index (RTree)
-        for feat in fiona.open(_INPUTPATH + "cells_" + str(k) + ".shp"):
-            # iterate the protection cells
-            geom = shape(feat['geometry'])
-            myid = feat['properties']['myid']
-            idx.insert(int(myid), geom.bounds, obj=geom)
-        idx.close()
+    return _rtree_from_items(_cell_items(k), path=None if in_memory else _INDEXPATH + str(k))
+
+
+def _rtree_from_items(items, path=None):
+    # STR bulk-loaded rtree from (id, bounds, object) items, in memory or in the files at path (overwritten)
+    items = list(items)
+    props = index.Property()
+    if path is not None:
+        props.overwrite = True
+        return index.Index(path, items, properties=props) if items else index.Index(path, properties=props)
+    return index.Index(items, properties=props) if items else index.Index(properties=props)
+
+
+def _build_rtree_file(k):
+    build_rtree(k).close()
+    return k
+
+
+def build_rtrees(ks=_K_VALUES, n_jobs=None):
+    """
+    Builds index structures of the site cluster cells, one process per value of k. Requires setting the
+    _INDEXPATH variable to the directory where the indices are stored
+
+    :param ks: values of k to build
+    :param n_jobs: number of worker processes (None: all cores, 1: sequential)
+    """
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(ks))
+    if n_jobs <= 1:
+        for k in ks:
+            _build_rtree_file(k)
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        list(pool.map(_build_rtree_file, ks))
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    # vectorized skmob.utils.gislib.getDistanceByHaversine
+    lng1 = lng1 * math.pi / 180.0
+    lng2 = lng2 * math.pi / 180.0
+    lat1 = lat1 * math.pi / 180.0
+    lat2 = lat2 * math.pi / 180.0
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2.0) ** 2
+    return _EARTH_RADIUS_KM * 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+def _speed_filter_mask(lat, lng, time, max_speed_kmh):
+    """
+    Array version of skmob.preprocessing.filtering.filter (without loops) for one time-sorted trajectory: a point
+    is removed if the speed from the previous kept point is higher than max_speed_kmh or if both share the same
+    timestamp. As in skmob, the last point is never removed.
+
+    :return: boolean numpy array, True for the points to keep
+    """
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    ns = time.astype('datetime64[ns]').astype(np.int64)
+
+    def too_fast(a, b):
+        dt = (ns[b] - ns[a]) / 1e9
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (dt == 0) | (_haversine_km(lat[a], lng[a], lat[b], lng[b]) / dt * 3600. > max_speed_kmh)
+
+    # pairs of consecutive points failing the speed test (the last point is never removed)
+    last = n - 1
+    bad = np.flatnonzero(too_fast(np.arange(last - 1), np.arange(1, last)))
+    i = 0
+    while True:
+        b = np.searchsorted(bad, i)
+        if b == len(bad):
+            break
+        # the points following the anchor are compared to it until one of them is kept,
+        # in blocks growing from 4 to _FILTER_BLOCK points
+        anchor = bad[b]
+        k = anchor + 1
+        size = 4
+        while k < last:
+            block = np.arange(k, min(k + size, last))
+            ok = np.flatnonzero(~too_fast(anchor, block))
+            stop = block[ok[0]] if len(ok) else block[-1] + 1
+            keep[k:stop] = False
+            k = stop
+            if len(ok):
+                break
+            size = min(2 * size, _FILTER_BLOCK)
+        i = k
+    return keep
+
+
+def _read_plt(path, max_speed_kmh=150):
+    """
+    Reads a Geolife plt file with the CSV engine, keeps the points inside _GEOLIFE_AREA and applies the speed
+    filter
+    :return: pandas.DataFrame with columns lon, lat, time
+    """
+    try:
+        raw = pd.read_csv(path, skiprows=6, header=None, usecols=[0, 1, 5, 6], dtype={5: str, 6: str})
+    except pd.errors.EmptyDataError:  # header lines only
+        return pd.DataFrame({'lon': np.empty(0), 'lat': np.empty(0), 'time': np.empty(0, dtype='datetime64[ns]')})
+    lon = raw[1].to_numpy(dtype=float)
+    lat = raw[0].to_numpy(dtype=float)
+    time = pd.to_datetime(raw[5] + ' ' + raw[6].str.strip(), format='%Y-%m-%d %H:%M:%S').to_numpy()
+    lon_min, lon_max, lat_min, lat_max = _GEOLIFE_AREA
+    inside = (lon_min < lon) & (lon < lon_max) & (lat_min < lat) & (lat < lat_max)
+    lon, lat, time = lon[inside], lat[inside], time[inside]
+
+    # same sort as skmob (quicksort): points sharing a timestamp are filtered in the same order
+    order = np.argsort(time, kind='quicksort')
+    lon, lat, time = lon[order], lat[order], time[order]
+    keep = _speed_filter_mask(lat, lon, time, max_speed_kmh)
+    return pd.DataFrame({'lon': lon[keep], 'lat': lat[keep], 'time': time[keep]})
 
 
 def geolife_to_df(path):
@@ -282,31 +549,54 @@ def geolife_to_df(path):
     :param path: path to the Geolife plt file
     :return: skmob.TrajDataFrame
     """
-    with open(path, 'r') as f:
-        for _ in range(6):
-            next(f)
-
-        df = pd.DataFrame(columns=['lon', 'lat', 'time'])
-        for line in f:
-            items = line.split(',')
-            strg = items[5] + ' ' + items[6][:-1]
-            ts = datetime.strptime(strg, '%Y-%m-%d %H:%M:%S')
-            lon = float(items[1])
-            lat = float(items[0])
-            # Filter points outside of the area covered by EPSG:2345
-            if 114.0 < lon < 120.0 and 22.14 < lat < 51.52:
-                df = df.append({'lon': lon, 'lat': lat,
-                                'time': ts}, ignore_index=True)
-        tdf = sm.TrajDataFrame(df, latitude='lat', longitude='lon', datetime='time')
-        ftdf = sm.preprocessing.filtering.filter(tdf, max_speed_kmh=150)
-        return ftdf
+    return sm.TrajDataFrame(_read_plt(path), latitude='lat', longitude='lon', datetime='time')
+
+
+def _read_geolife_file(item):
+    uid, tid, path = item
+    df = _read_plt(path)
+    df['uid'] = uid
+    df['tid'] = tid
+    return df
+
+
+def geolife_dir_to_df(root, n_jobs=None, cache_path=None):
+    """
+    Parses all the trajectories of a Geolife directory tree (root/<user>/Trajectory/<trajectory>.plt) in parallel
+    and creates one multi-user trajectory dataframe. Each file is filtered as in geolife_to_df.
+
+    :param root: path to the Geolife Data directory
+    :param n_jobs: number of worker processes reading files (None: all cores, 1: sequential)
+    :param cache_path: optional Parquet file. If it exists, the trajectories are read from it instead of root;
+        otherwise it is written after parsing (requires a Parquet engine such as pyarrow)
+    :return: skmob.TrajDataFrame with the user id (directory name) in uid and the trajectory id (file name) in tid
+    """
+    if cache_path and os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path)
+    else:
+        items = []
+        for path in sorted(glob(os.path.join(root, '**', '*.plt'), recursive=True)):
+            uid = os.path.relpath(path, root).split(os.sep)[0]
+            items.append((uid, os.path.splitext(os.path.basename(path))[0], path))
+
+        n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(items), 1))
+        if n_jobs <= 1:
+            frames = [_read_geolife_file(item) for item in items]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                frames = list(pool.map(_read_geolife_file, items, chunksize=16))
+        columns = ['lon', 'lat', 'time', 'uid', 'tid']
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        if cache_path:
+            df.to_parquet(cache_path, index=False)
+
+    return sm.TrajDataFrame(df, latitude='lat', longitude='lon', datetime='time', user_id='uid', trajectory_id='tid')
 
 
 def example():
     """
     Example function, uses S-TT to truncate a trajectory from the Geolife dataset
     """
-    build_rtrees()
 
     # load a Geolife trajectory
     trajectory_path = "/home/user/example.plt"
@@ -324,7 +614,8 @@ def example():
               truncation_region=beijing_study_area,
               k=k, alpha=alpha, buffer=b,
               add_endpoints=True,
-              add_stops=True)
+              add_stops=True,
+              in_memory_index=True)
     truncated_trajectory = stt.truncate([tdf])[0]
     print(truncated_trajectory)
 
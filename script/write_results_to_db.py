@@ -0,0 +1,140 @@
+import io
+import pandas as pd
+
+# Tables de résultats : nom → colonnes écrites (hors participant_id / run_id)
+RESULT_TABLES = {
+    'seg_raw_stops': {
+        'start_time': 'TIMESTAMPTZ',
+        'end_time':   'TIMESTAMPTZ',
+        'duration_s': 'DOUBLE PRECISION',
+        'lat':        'DOUBLE PRECISION',
+        'lon':        'DOUBLE PRECISION',
+    },
+    'seg_places': {
+        'start_time': 'TIMESTAMPTZ',
+        'end_time':   'TIMESTAMPTZ',
+        'duration_s': 'DOUBLE PRECISION',
+        'lat':        'DOUBLE PRECISION',
+        'lon':        'DOUBLE PRECISION',
+        'place_type': 'TEXT',
+    },
+    'seg_moves': {
+        'start_time':       'TIMESTAMPTZ',
+        'end_time':         'TIMESTAMPTZ',
+        'duration_s':       'DOUBLE PRECISION',
+        'lat_origin':       'DOUBLE PRECISION',
+        'lon_origin':       'DOUBLE PRECISION',
+        'lat_dest':         'DOUBLE PRECISION',
+        'lon_dest':         'DOUBLE PRECISION',
+        'dist_m':           'DOUBLE PRECISION',
+        'origin_type':      'TEXT',
+        'destination_type': 'TEXT',
+        'transition':       'TEXT',
+    },
+}
+
+
+def _to_paris(series: pd.Series) -> pd.Series:
+    # Les stops MovingPandas sont tz-naive (heure locale), les autres tz-aware
+    series = pd.to_datetime(series)
+    if series.dt.tz is None:
+        return series.dt.tz_localize('Europe/Paris')
+    return series.dt.tz_convert('Europe/Paris')
+
+
+def _to_csv_buffer(df: pd.DataFrame, columns: dict, pid: str, run_id: str) -> io.StringIO:
+    out = pd.DataFrame(index=df.index)
+    out['participant_id'] = pid
+    out['run_id'] = run_id
+    for col, sql_type in columns.items():
+        if col not in df.columns:
+            out[col] = None
+        elif sql_type == 'TIMESTAMPTZ':
+            out[col] = _to_paris(df[col]).map(lambda ts: ts.isoformat() if pd.notna(ts) else None)
+        else:
+            out[col] = df[col]
+
+    buf = io.StringIO()
+    out.to_csv(buf, header=False, index=False, na_rep='')
+    buf.seek(0)
+    return buf
+
+
+def create_result_tables(cursor) -> None:
+    """
+    Crée les tables de résultats (et leur index (participant_id, run_id)) si besoin.
+    """
+    for table, columns in RESULT_TABLES.items():
+        cols_sql = ",\n".join(f"    {col} {sql_type}" for col, sql_type in columns.items())
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (\n"
+            f"    participant_id TEXT NOT NULL,\n"
+            f"    run_id TEXT NOT NULL,\n"
+            f"{cols_sql}\n)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_pid_run_idx ON {table} (participant_id, run_id)"
+        )
+
+
+def write_results_to_db(
+    engine,
+    pid: str,
+    run_id: str,
+    raw_stops: pd.DataFrame,
+    final_stops: pd.DataFrame,
+    moves: pd.DataFrame
+) -> dict:
+    """
+    Écrit les résultats d'un participant dans les tables seg_raw_stops,
+    seg_places et seg_moves de la base source.
+
+    Chaque table est remplie par un unique COPY FROM STDIN (format CSV), après
+    suppression des lignes existantes pour (participant_id, run_id) : relancer
+    un même run remplace ses résultats au lieu de les dupliquer. Le tout se fait
+    dans une seule transaction.
+
+    Args:
+        engine: moteur SQLAlchemy (driver psycopg2)
+        pid (str): identifiant du participant
+        run_id (str): identifiant du run (clé d'idempotence avec pid)
+        raw_stops, final_stops, moves (pd.DataFrame): sorties du pipeline
+
+    Returns:
+        dict: nombre de lignes écrites par table
+    """
+    frames = {
+        'seg_raw_stops': raw_stops,
+        'seg_places':    final_stops,
+        'seg_moves':     moves,
+    }
+    written = {}
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            create_result_tables(cur)
+            for table, columns in RESULT_TABLES.items():
+                df = frames[table]
+                cur.execute(
+                    f"DELETE FROM {table} WHERE participant_id = %s AND run_id = %s",
+                    (str(pid), str(run_id))
+                )
+                if df is None or df.empty:
+                    written[table] = 0
+                    continue
+                buf = _to_csv_buffer(df, columns, str(pid), str(run_id))
+                col_list = ", ".join(['participant_id', 'run_id', *columns])
+                cur.copy_expert(
+                    f"COPY {table} ({col_list}) FROM STDIN WITH (FORMAT csv)",
+                    buf
+                )
+                written[table] = len(df)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return written
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# les modules du pipeline sont importés par leur nom depuis script/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'script'))
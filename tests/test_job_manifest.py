@@ -0,0 +1,99 @@
+import os
+import time
+
+from job_manifest import JobManifest
+
+
+def make_workers(tmp_path, *names, lease_s=60):
+    workers = [JobManifest(str(tmp_path), worker_id=name, lease_s=lease_s) for name in names]
+    for w in workers:
+        w.init(['p1'])
+    return workers
+
+
+def expire(manifest, pid):
+    gen, lock = manifest._current_lock(pid)
+    os.utime(lock, (0, 0))
+
+
+def outdated_view(manifest, observation):
+    # le premier appel de _current_lock renvoie un état observé plus tôt
+    calls = []
+
+    def current_lock(pid):
+        calls.append(pid)
+        return observation if len(calls) == 1 else JobManifest._current_lock(manifest, pid)
+    manifest._current_lock = current_lock
+
+
+def test_single_claim(tmp_path):
+    a, b = make_workers(tmp_path, 'A', 'B')
+    assert a.claim_next() == 'p1'
+    assert b.claim_next() is None
+    assert a.status('p1') == 'running'
+
+
+def test_two_workers_breaking_the_same_stale_lock(tmp_path):
+    z, a, b = make_workers(tmp_path, 'Z', 'A', 'B')
+    assert z.claim_next() == 'p1'
+    expire(z, 'p1')
+
+    # B voit le verrou expiré de Z, puis A le reprend avant que B n'agisse
+    stale = b._current_lock('p1')
+    assert a.claim_next() == 'p1'
+    outdated_view(b, stale)
+    assert b.claim_next() is None
+
+    gen, lock = a._current_lock('p1')
+    assert a._held['p1'] == gen and not a._is_stale(lock)
+    assert b.claim_next() is None
+
+
+def test_outdated_view_after_two_takeovers(tmp_path):
+    z, a, b, c = make_workers(tmp_path, 'Z', 'A', 'B', 'C')
+    assert z.claim_next() == 'p1'
+    expire(z, 'p1')
+    stale = c._current_lock('p1')           # C voit la génération 0 expirée
+    assert a.claim_next() == 'p1'           # génération 1
+    expire(a, 'p1')
+    assert b.claim_next() == 'p1'           # génération 2, la 1 est supprimée
+
+    # C crée la génération 1, qui n'est pas le verrou courant : il y renonce
+    outdated_view(c, stale)
+    assert c.claim_next() is None
+    assert b._lock_gens('p1') == [2]
+
+
+def test_superseded_owner_does_not_release_new_owner(tmp_path):
+    a, c, d = make_workers(tmp_path, 'A', 'C', 'D')
+    assert a.claim_next() == 'p1'
+    expire(a, 'p1')
+    assert c.claim_next(steal=True) == 'p1'
+
+    a.heartbeat('p1')
+    a.mark_failed('p1', 'lent')
+    os.remove(a._status_path('p1'))
+    assert c.status('p1') == 'running'
+    assert d.claim_next() is None
+
+    c.mark_done('p1')
+    assert c.status('p1') == 'done'
+    assert d.claim_next() is None
+
+
+def test_finished_lock_can_be_retried(tmp_path):
+    a, b = make_workers(tmp_path, 'A', 'B')
+    assert a.claim_next() == 'p1'
+    a.mark_failed('p1', 'erreur')
+    assert b.claim_next() is None
+    assert b.claim_next(retry_failed=True) == 'p1'
+    assert b._held['p1'] == 1
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    a, b = make_workers(tmp_path, 'A', 'B', lease_s=1)
+    assert a.claim_next() == 'p1'
+    expire(a, 'p1')
+    with a.keep_alive('p1', interval_s=0.05):
+        time.sleep(0.2)
+        assert b.claim_next() is None
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from detect_stops_and_analyze import merge_point_summaries, summarize_points
+
+
+def test_window_summaries_merge_to_the_full_summary():
+    rng = np.random.default_rng(0)
+    ts = pd.date_range('2024-03-30 00:00', '2024-04-01 23:59', freq='37s', tz='Europe/Paris')
+    df = pd.DataFrame({
+        'timestamp': ts,
+        'speed_kmh': np.where(rng.random(len(ts)) < 0.05, np.nan, rng.gamma(2, 3, len(ts))),
+        'dist_m': rng.random(len(ts)) * 50,
+        'time_diff_s': 37.0,
+    })
+    days = df['timestamp'].dt.date
+    merged = merge_point_summaries([summarize_points(df[days == d]) for d in sorted(set(days))])
+    full = summarize_points(df)
+
+    pd.testing.assert_frame_equal(merged['cube'], full['cube'])
+    for key in ('nb_points', 'speed_count', 'time_diff_count', 'speed_max', 't_min', 't_max'):
+        assert merged[key] == full[key]
+    for key in ('dist_m', 'speed_sum', 'time_diff_sum'):
+        assert np.isclose(merged[key], full[key])
@@ -0,0 +1,27 @@
+import numpy as np
+import shapely
+from shapely.geometry import LineString
+
+from simplify_trajectory import douglas_peucker_mask, simplify_latlon, to_local_xy
+
+
+def test_excursion_beyond_segment_end_is_kept():
+    assert douglas_peucker_mask([0, 1000, 10], [0, 0, 0], 5).tolist() == [True, True, True]
+
+
+def test_out_and_back_trip_is_not_collapsed():
+    lat = [48.85, 48.86, 48.87, 48.86, 48.8501]
+    lon = [2.35] * 5
+    keep = simplify_latlon(lat, lon, 10)
+    assert keep[2]  # point de demi-tour, à ~2 km des extrémités
+    assert keep[0] and keep[-1]
+
+
+def test_matches_shapely_simplify():
+    rng = np.random.default_rng(0)
+    lat = 48.85 + np.cumsum(rng.normal(0, 1e-4, 500))
+    lon = 2.35 + np.cumsum(rng.normal(0, 1e-4, 500))
+    x, y = to_local_xy(lat, lon)
+    keep = douglas_peucker_mask(x, y, 10)
+    expected = shapely.simplify(LineString(np.column_stack([x, y])), 10, preserve_topology=False)
+    assert np.allclose(np.column_stack([x, y])[keep], np.asarray(expected.coords))